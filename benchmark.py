@@ -0,0 +1,450 @@
+import argparse
+import contextlib
+import gc
+import importlib.util
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')   # 'suite' escribe JSON por la salida estándar
+import conway
+import train
+
+# --------------------
+# Utilidades
+# --------------------
+def ticks_per_sec(step, min_time=1.0, max_ticks=200):
+    """Llama a step() hasta acumular min_time segundos (o max_ticks) y devuelve ticks/s."""
+    ticks = 0
+    start = time.perf_counter()
+    while ticks < max_ticks:
+        step()
+        ticks += 1
+        if time.perf_counter() - start >= min_time:
+            break
+    return ticks / (time.perf_counter() - start)
+
+def seed_all(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+# --------------------
+# Motores de train.py
+# --------------------
+def bench_engines(args):
+    print(f"{'agentes':>8} " + " ".join(f"{name:>12}" for name in sorted(train.WORLD_ENGINES)))
+    for n in args.agents:
+        row = []
+        for name in sorted(train.WORLD_ENGINES):
+            seed_all(args.seed)
+            w = train.WORLD_ENGINES[name](0, initial_agents=n)
+            w.update()  # calentamiento
+            row.append(ticks_per_sec(w.update, args.min_time))
+        print(f"{n:>8} " + " ".join(f"{r:>9.1f} t/s" for r in row))
+
+def bench_inference(args):
+    print(f"{'agentes':>8} {'por agente':>14} {'en lote':>14}")
+    for n in args.agents:
+        seed_all(args.seed)
+        total = n * train.NUM_WORLDS
+        brains = [train.SimpleBrain() for _ in range(total)]
+        X = np.random.rand(total, train.OBS_SIZE)
+        W1 = np.stack([b.W1 for b in brains])
+        W2 = np.stack([b.W2 for b in brains])
+
+        def per_agent():
+            for b, x in zip(brains, X):
+                b.select_action(x)
+
+        def batched():
+            train.sample_actions(train.policy_forward(W1, W2, X)[0])
+
+        rates = [ticks_per_sec(f, args.min_time) * total for f in (per_agent, batched)]
+        print(f"{n:>8} " + " ".join(f"{r:>10.0f} a/s" for r in rates))
+
+def bench_workers(args):
+    print(f"{'procesos':>8} {'ticks-mundo/s':>14} {'aceleración':>12}")
+    base = None
+    for n in args.workers:
+        runner = train.ParallelWorlds(n, engine=args.engine, initial_agents=args.agents,
+                                      ticks_per_sync=args.sync, seed=args.seed)
+        runner.step()  # calentamiento
+        rate = ticks_per_sec(runner.step, args.min_time) * args.sync * train.NUM_WORLDS
+        runner.close()
+        base = base or rate
+        print(f"{n:>8} {rate:>14.1f} {rate / base:>11.2f}x")
+
+def count_calls(cls, counter, key, method='__init__'):
+    """Envuelve cls.method (también si es un classmethod) para contar sus llamadas en counter[key]."""
+    raw = cls.__dict__[method]
+    f = raw.__func__ if isinstance(raw, classmethod) else raw
+    def counted(*args, **kwargs):
+        counter[key] += 1
+        return f(*args, **kwargs)
+    setattr(cls, method, classmethod(counted) if isinstance(raw, classmethod) else counted)
+
+def bench_allocs(args):
+    # view() cubre todo cerebro creado sin __init__: copy() y las ranuras del pool
+    counter = dict.fromkeys(('AgentCell', 'SimpleBrain', 'copy', 'view'), 0)
+    count_calls(train.AgentCell, counter, 'AgentCell')
+    count_calls(train.SimpleBrain, counter, 'SimpleBrain')
+    count_calls(train.SimpleBrain, counter, 'copy', 'copy')
+    count_calls(train.SimpleBrain, counter, 'view', 'view')
+    seed_all(args.seed)
+    w = train.SmallWorld(0, initial_agents=args.agents)
+
+    def tick():
+        if args.fed:
+            for ag in w.agents:
+                ag.hunger = ag.thirst = 100.0
+        w.update()
+
+    for _ in range(args.warmup):
+        tick()
+    counter.update(dict.fromkeys(counter, 0))
+    births = 0
+    gen0 = gc.get_stats()[0]['collections']
+    tracemalloc.start()
+    peaks = []
+    for _ in range(args.ticks):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        tick()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        births += len(w.new_agents)
+    tracemalloc.stop()
+    gen0 = gc.get_stats()[0]['collections'] - gen0
+    t = args.ticks
+    print(f"agentes al final: {len(w.agents)} | nacimientos/tick: {births / t:.2f}")
+    print(f"AgentCell creados/tick: {counter['AgentCell'] / t:.2f} | "
+          f"SimpleBrain creados/tick: {counter['SimpleBrain'] / t:.2f} | "
+          f"copy()/tick: {counter['copy'] / t:.2f} | view()/tick: {counter['view'] / t:.2f}")
+    print(f"recolecciones gen0/tick: {gen0 / t:.3f} | "
+          f"pico de memoria transitoria/tick: {np.mean(peaks) / 1024:.1f} KiB (p99 {np.percentile(peaks, 99) / 1024:.1f})")
+
+# --------------------
+# Motores de conway.py
+# --------------------
+def bench_conway(args):
+    names = args.engines
+    print(f"{'lado':>6} " + " ".join(f"{name:>21}" for name in names)
+          + (f" {'listas':>21}" if args.reference else ""))
+    for side in args.sizes:
+        seed_all(args.seed)
+        grid = conway.random_grid(side, side)
+        row = []
+        for name in names:
+            life = conway.ENGINES[name](grid)
+            life.step()  # calentamiento
+            gens_per_step = life.generation
+            row.append(ticks_per_sec(life.step, args.min_time) * gens_per_step)
+            if hasattr(life, 'close'):
+                life.close()
+        if args.reference and side <= 400:
+            cells = grid.tolist()
+            row.append(ticks_per_sec(lambda: conway.reference_step(cells), args.min_time, max_ticks=5))
+        cells_per_sec = " ".join(f"{r:>7.1f} g/s {r * side * side / 1e6:>5.0f} Mc/s" for r in row)
+        print(f"{side:>6} {cells_per_sec}")
+
+def bench_tiles(args):
+    seed_all(args.seed)
+    grid = conway.random_grid(args.size, args.size, args.density)
+    tiled = conway.TiledGrid(grid, args.tile)
+    dense = conway.LifeGrid(grid)
+    print(f"{'generación':>10} {'teselas activas':>16} {'tiles g/s':>10} {'numpy g/s':>10}")
+    while tiled.generation < args.gens:
+        active = []
+        start = time.perf_counter()
+        for _ in range(args.every):
+            tiled.step()
+            active.append(tiled.active)
+        tiled_rate = args.every / (time.perf_counter() - start)
+        dense_rate = ticks_per_sec(dense.step, args.min_time / 4, max_ticks=args.every)
+        print(f"{tiled.generation:>10} {np.mean(active):>9.1f}/{tiled.tiles:<6} "
+              f"{tiled_rate:>10.1f} {dense_rate:>10.1f}")
+
+def bench_bands(args):
+    seed_all(args.seed)
+    grid = conway.random_grid(args.size, args.size)
+    print(f"{'procesos':>8} {'halo':>5} {'g/s':>9} {'aceleración':>12}")
+    base = ticks_per_sec(conway.LifeGrid(grid).step, args.min_time)
+    print(f"{'numpy':>8} {'-':>5} {base:>9.1f} {1:>11.2f}x")
+    for n in args.workers:
+        for halo in args.halo:
+            life = conway.BandedGrid(grid, n, halo)
+            life.step()  # calentamiento
+            rate = ticks_per_sec(life.step, args.min_time) * halo
+            life.close()
+            print(f"{n:>8} {halo:>5} {rate:>9.1f} {rate / base:>11.2f}x")
+
+def bench_hashlife(args):
+    print(f"{'salto':>8} {'segundos':>10} {'generaciones/s':>16} {'población':>10} {'nodos':>9}")
+    seed_all(args.seed)
+    life = conway.HashLife(conway.random_grid(args.soup, args.soup))
+    for k in args.jumps:
+        start = time.perf_counter()
+        life.advance(k)
+        secs = time.perf_counter() - start
+        print(f"{'2^' + str(k):>8} {secs:>10.2f} {(1 << k) / secs:>16.3g} {life.population:>10} {len(life._nodes):>9}")
+
+# --------------------
+# Suite reproducible: JSON y comparación con una línea base
+# --------------------
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def import_headless(name, filename):
+    """Importa un script de pygame sin ventana (main .py no es importable por su nombre)."""
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def cycle_calls(f, items):
+    """Paso que llama a f con el siguiente elemento de items en cada llamada."""
+    it = iter(())
+    def step():
+        nonlocal it
+        try:
+            f(next(it))
+        except StopIteration:
+            it = iter(items)
+            f(next(it))
+    return step
+
+def setup_world(engine):
+    def setup(n):
+        w = train.WORLD_ENGINES[engine](0, initial_agents=n)
+        w.update()
+        return w.update
+    return setup
+
+def setup_train_sense(n):
+    w = train.SmallWorld(0, initial_agents=n)
+    w.update()
+    return cycle_calls(train.AgentCell.sense, w.agents)
+
+def setup_select_action(n):
+    brain = train.SimpleBrain()
+    return cycle_calls(brain.select_action, np.random.rand(n, train.OBS_SIZE))
+
+def setup_vecenv(n):
+    """Un paso de VecEnv (16 mundos con n agentes iniciales) con acciones aleatorias."""
+    env = train.VecEnv(initial_agents=n)
+    obs, _ = env.reset()
+
+    def step():
+        nonlocal obs
+        obs = env.step(np.random.randint(0, train.NUM_ACTIONS, len(obs)))[0]
+    return step
+
+def setup_prototype(n, what):
+    proto = import_headless('prototype', 'prototype.py')
+    proto.save_brain = lambda brain: None
+    for agent in proto.agent_cells:
+        agent.alive = False
+    proto.pool.release(proto.agent_cells)
+    proto.agent_cells = []
+
+    def refill():
+        # Sin reposición la población inicial muere de hambre y se mediría un mapa vacío
+        while len(proto.agent_cells) < n:
+            proto.agent_cells.append(proto.pool.spawn(random.randrange(proto.MAP_WIDTH),
+                                                      random.randrange(proto.MAP_HEIGHT)))
+    refill()
+    if what == 'sense':
+        return cycle_calls(proto.AgentCell.sense, list(proto.agent_cells))
+
+    def step():
+        refill()
+        proto.step_simulation()
+    return step
+
+def setup_conway(n, engine):
+    grid = conway.random_grid(n, n)
+    if engine == 'reference':
+        cells = grid.tolist()
+        return lambda: conway.reference_step(cells)
+    return conway.ENGINES[engine](grid).step
+
+def setup_movimiento(n):
+    """El personaje se mueve al azar por un mapa con n recursos y siempre con hambre y sed."""
+    juego = import_headless('main_py', 'main .py')
+    celdas = [(x, y) for x in range(juego.MAX_COLUMNAS + 1) for y in range(juego.MAX_FILAS + 1)]
+    random.shuffle(celdas)
+    juego.total_elementos.clear()
+    juego.mapa_elementos.clear()
+    for x, y in celdas[:n]:
+        color = random.choice((juego.COLOR_RIO, juego.COLOR_ARBUSTO))
+        recurso = juego.RecursoCelda(x, y, capacidad_max=10**9, color=color)
+        juego.total_elementos[recurso] = None
+        juego.mapa_elementos[(x, y)] = recurso
+    stats = juego.personaje.stats
+
+    def mover(tecla):
+        stats['agua'] = stats['comida'] = 50
+        juego.manejar_movimiento(tecla, 0)
+    teclas = random.choices((juego.K_w, juego.K_s, juego.K_a, juego.K_d), k=4096)
+    return cycle_calls(mover, teclas)
+
+# nombre -> (preparación(tamaño) que devuelve el paso a medir, tamaños)
+SUITE = {
+    'train.SmallWorld.update':        (setup_world('objects'), [30, 300, 1000]),
+    'train.ArrayWorld.update':        (setup_world('arrays'), [30, 300, 1000]),
+    'train.AgentCell.sense':          (setup_train_sense, [30, 300, 1000]),
+    'train.SimpleBrain.select_action': (setup_select_action, [1024]),
+    'train.VecEnv.step':              (setup_vecenv, [30, 300]),
+    'prototype.step_simulation':      (lambda n: setup_prototype(n, 'step'), [20, 200]),
+    'prototype.AgentCell.sense':      (lambda n: setup_prototype(n, 'sense'), [20, 200]),
+    'conway.reference_step':          (lambda n: setup_conway(n, 'reference'), [50, 100]),
+    'conway.LifeGrid.step':           (lambda n: setup_conway(n, 'numpy'), [200, 1024, 4096]),
+    'conway.BitGrid.step':            (lambda n: setup_conway(n, 'bits'), [200, 1024, 4096]),
+    'main.manejar_movimiento':        (setup_movimiento, [50, 200, 800]),
+}
+
+def run_case(name, size, seed, min_time, max_calls):
+    """Mide un caso en un proceso nuevo: semillas fijas, sin salida y en un directorio vacío."""
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        os.chdir(tmp)   # ni se lee ni se pisa el best_brain.npz del usuario
+        seed_all(seed)
+        step = SUITE[name][0](size)
+        for _ in range(3):
+            step()  # calentamiento
+        times = []
+        clock = time.perf_counter
+        start = clock()
+        while len(times) < max_calls and (len(times) < 20 or clock() - start < min_time):
+            t = clock()
+            step()
+            times.append(clock() - t)
+        total = clock() - start
+    times = np.array(times) * 1e3
+    return {
+        'ticks_per_sec': len(times) / total,
+        'p50_ms': float(np.percentile(times, 50)),
+        'p99_ms': float(np.percentile(times, 99)),
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'calls': len(times),
+    }
+
+def compare(results, baseline, tolerance):
+    """Imprime la relación con la línea base y devuelve los casos más lentos que la tolerancia."""
+    slower = []
+    print(f"{'caso':<42} {'t/s':>10} {'base':>10} {'relación':>9} {'p99 ms':>9} {'RSS MiB':>8}", file=sys.stderr)
+    for key, r in results.items():
+        b = baseline.get(key)
+        ratio = r['ticks_per_sec'] / b['ticks_per_sec'] if b else float('nan')
+        mark = ''
+        if b and ratio < 1 - tolerance:
+            slower.append(key)
+            mark = '  <- más lento'
+        print(f"{key:<42} {r['ticks_per_sec']:>10.1f} {b['ticks_per_sec'] if b else float('nan'):>10.1f} "
+              f"{ratio:>8.2f}x {r['p99_ms']:>9.3f} {r['peak_rss_kib'] / 1024:>8.1f}{mark}", file=sys.stderr)
+    return slower
+
+def bench_suite(args):
+    cases = [(name, size) for name, (_, sizes) in SUITE.items()
+             if not args.cases or any(name.startswith(c) for c in args.cases)
+             for size in sizes]
+    results = {}
+    # maxtasksperchild=1: cada caso en un proceso limpio, para que el pico de RSS sea sólo suyo
+    with mp.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        for name, size in cases:
+            key = f"{name}[{size}]"
+            print(f"{key}...", file=sys.stderr, flush=True)
+            results[key] = pool.apply(run_case, (name, size, args.seed, args.min_time, args.max_calls))
+    report = {
+        'meta': {'seed': args.seed, 'min_time': args.min_time, 'python': platform.python_version(),
+                 'numpy': np.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f)['results'], args.tolerance)
+        if slower:
+            sys.exit(f"{len(slower)} casos más lentos que la línea base (tolerancia {args.tolerance:.0%})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de los simuladores")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-time', type=float, default=1.0, help="segundos mínimos por medición")
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('engines', help="ticks/s de SmallWorld vs ArrayWorld")
+    p.add_argument('--agents', type=int, nargs='+', default=[30, 300, 1000])
+    p.set_defaults(func=bench_engines)
+
+    p = sub.add_parser('inference', help="acciones/s: select_action por agente vs lote de 16 mundos")
+    p.add_argument('--agents', type=int, nargs='+', default=[30, 300, 1000], help="agentes por mundo")
+    p.set_defaults(func=bench_inference)
+
+    p = sub.add_parser('workers', help="escalado de ParallelWorlds con el número de procesos")
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    p.add_argument('--engine', choices=sorted(train.WORLD_ENGINES), default='objects')
+    p.add_argument('--agents', type=int, default=train.INITIAL_AGENTS, help="agentes iniciales por mundo")
+    p.add_argument('--sync', type=int, default=10, help="ticks por sincronización")
+    p.set_defaults(func=bench_workers)
+
+    p = sub.add_parser('allocs', help="asignaciones por tick de SmallWorld (objetos, cerebros, gc, memoria)")
+    p.add_argument('--agents', type=int, default=200, help="agentes iniciales")
+    p.add_argument('--warmup', type=int, default=400, help="ticks antes de medir (hasta que haya adultos)")
+    p.add_argument('--ticks', type=int, default=200)
+    p.add_argument('--fed', action='store_true',
+                   help="mantener a los agentes saciados para forzar nacimientos (población cerca de MAX_AGENTS)")
+    p.set_defaults(func=bench_allocs)
+
+    p = sub.add_parser('conway', help="generaciones/s de los motores de conway.py")
+    p.add_argument('--sizes', type=int, nargs='+', default=[200, 512, 1024, 2048, 4096], help="lado del mapa")
+    p.add_argument('--engines', nargs='+', choices=sorted(conway.ENGINES),
+                   default=[name for name in sorted(conway.ENGINES) if name not in ('hashlife', 'bands')])
+    p.add_argument('--reference', action='store_true', help="incluir el paso sobre listas (hasta 400²)")
+    p.set_defaults(func=bench_conway)
+
+    p = sub.add_parser('tiles', help="teselas activas por generación y g/s del modo por teselas")
+    p.add_argument('--size', type=int, default=1024, help="lado del mapa")
+    p.add_argument('--density', type=float, default=0.05, help="densidad de la sopa inicial")
+    p.add_argument('--tile', type=int, default=32)
+    p.add_argument('--gens', type=int, default=2000)
+    p.add_argument('--every', type=int, default=200, help="generaciones por línea del informe")
+    p.set_defaults(func=bench_tiles)
+
+    p = sub.add_parser('bands', help="generaciones/s del motor por bandas según el número de procesos")
+    p.add_argument('--size', type=int, default=4096, help="lado del mapa")
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    p.add_argument('--halo', type=int, nargs='+', default=[1, 8], help="filas de halo (generaciones por sincronización)")
+    p.set_defaults(func=bench_bands)
+
+    p = sub.add_parser('hashlife', help="saltos de 2^k generaciones de HashLife sobre una sopa aleatoria")
+    p.add_argument('--soup', type=int, default=64, help="lado de la sopa inicial")
+    p.add_argument('--jumps', type=int, nargs='+', default=[4, 8, 12, 16, 20])
+    p.set_defaults(func=bench_hashlife)
+
+    p = sub.add_parser('suite', help="todos los simuladores con semillas fijas; JSON y comparación con una línea base")
+    p.add_argument('--cases', nargs='+', help="sólo los casos que empiezan por estos prefijos")
+    p.add_argument('--max-calls', type=int, default=100000, help="llamadas máximas por caso")
+    p.add_argument('--out', help="archivo JSON de resultados (por defecto, la salida estándar)")
+    p.add_argument('--baseline', help="JSON de una ejecución anterior con el que comparar")
+    p.add_argument('--tolerance', type=float, default=0.1,
+                   help="caída de ticks/s admitida frente a la línea base antes de fallar")
+    p.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
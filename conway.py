@@ -1,5 +1,12 @@
+import argparse
+import itertools
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import os
+import re
+import signal
 import pygame
-import random
+import numpy as np
 
 # Configuración
 WIDTH, HEIGHT = 800, 600
@@ -11,84 +18,752 @@ BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 ALIVE_COLOR = (50, 200, 50)
 GRID_COLOR = (40, 40, 40)
-
-# Inicializar
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-clock = pygame.time.Clock()
+PALETTE = np.array([BLACK, ALIVE_COLOR], dtype=np.uint8)
 
 # Mapa más grande que la pantalla
 MAP_WIDTH = 200
 MAP_HEIGHT = 200
-grid = [[random.choice([0, 1]) for _ in range(MAP_WIDTH)] for _ in range(MAP_HEIGHT)]
 
-# Offset para mover el mapa
-offset_x = 0
-offset_y = 0
 move_speed = 10
 
-def count_neighbors(x, y):
+# --------------------
+# Reglas (B3/S23, bordes muertos)
+# --------------------
+def count_neighbors(grid, x, y):
     count = 0
     for dy in [-1, 0, 1]:
         for dx in [-1, 0, 1]:
             if dx == 0 and dy == 0:
                 continue
             nx, ny = x + dx, y + dy
-            if 0 <= nx < MAP_WIDTH and 0 <= ny < MAP_HEIGHT:
+            if 0 <= ny < len(grid) and 0 <= nx < len(grid[0]):
                 count += grid[ny][nx]
     return count
 
-def update_grid():
-    global grid
-    new_grid = [[0 for _ in range(MAP_WIDTH)] for _ in range(MAP_HEIGHT)]
-    for y in range(MAP_HEIGHT):
-        for x in range(MAP_WIDTH):
-            neighbors = count_neighbors(x, y)
+def reference_step(grid):
+    """Generación siguiente celda a celda sobre listas; referencia para los demás motores."""
+    height, width = len(grid), len(grid[0])
+    new_grid = [[0 for _ in range(width)] for _ in range(height)]
+    for y in range(height):
+        for x in range(width):
+            neighbors = count_neighbors(grid, x, y)
             if grid[y][x] == 1:
                 if neighbors == 2 or neighbors == 3:
                     new_grid[y][x] = 1
             else:
                 if neighbors == 3:
                     new_grid[y][x] = 1
-    grid = new_grid
-
-running = True
-while running:
-    clock.tick(FPS)
-    screen.fill(BLACK)
-
-    # Eventos
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    # Movimiento con teclas
-    keys = pygame.key.get_pressed()
-    if keys[pygame.K_w]:
-        offset_y += move_speed
-    if keys[pygame.K_s]:
-        offset_y -= move_speed
-    if keys[pygame.K_a]:
-        offset_x += move_speed
-    if keys[pygame.K_d]:
-        offset_x -= move_speed
-
-    # Dibujar
-    for y in range(MAP_HEIGHT):
-        for x in range(MAP_WIDTH):
-            if grid[y][x] == 1:
-                draw_x = x * CELL_SIZE + offset_x
-                draw_y = y * CELL_SIZE + offset_y
-                if -CELL_SIZE < draw_x < WIDTH and -CELL_SIZE < draw_y < HEIGHT:
-                    pygame.draw.rect(screen, ALIVE_COLOR, (draw_x, draw_y, CELL_SIZE, CELL_SIZE))
+    return new_grid
+
+def random_grid(width, height, density=0.5):
+    return (np.random.rand(height, width) < density).astype(np.uint8)
+
+# --------------------
+# Patrones (RLE, .cells) e instantáneas
+# --------------------
+RLE_HEADER = re.compile(r'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)(?:\s*,\s*rule\s*=\s*(\S+))?', re.I)
+RLE_TOKEN = re.compile(r'(\d*)([^\d\s])')
+SNAPSHOT_MAGIC = b'LIFEBITS'
+
+def _pattern_out(out, height, width, x0, y0):
+    if out is None:
+        return np.zeros((height, width), dtype=np.uint8), 0, 0
+    if y0 + height > out.shape[0] or x0 + width > out.shape[1]:
+        raise ValueError(f"el patrón de {width}x{height} no cabe en el mapa en ({x0}, {y0})")
+    return out, x0, y0
+
+def read_rle(path, out=None, x0=0, y0=0):
+    """Decodifica un fichero RLE línea a línea directamente en out (o en un arreglo nuevo de su tamaño)."""
+    with open(path) as f:
+        for line in f:
+            if not line.startswith('#') and line.strip():
+                break
+        m = RLE_HEADER.match(line.strip())
+        if not m:
+            raise ValueError(f"{path}: falta la cabecera 'x = ..., y = ...'")
+        width, height, rule = int(m.group(1)), int(m.group(2)), m.group(3)
+        if rule and rule.upper() not in ('B3/S23', '23/3'):
+            raise ValueError(f"{path}: regla {rule} no soportada (sólo B3/S23)")
+        out, x0, y0 = _pattern_out(out, height, width, x0, y0)
+        x = y = 0
+        pending = ''
+        for line in f:
+            # Un número puede quedar partido al final de una línea
+            line = pending + line.strip()
+            digits = len(line) - len(line.rstrip('0123456789'))
+            pending, line = line[len(line) - digits:], line[:len(line) - digits]
+            for m in RLE_TOKEN.finditer(line):
+                run, tag = int(m.group(1) or 1), m.group(2)
+                if tag == '!':
+                    return out
+                if tag == '$':
+                    y, x = y + run, 0
+                elif tag in 'b.':
+                    x += run
+                else:
+                    out[y0 + y, x0 + x:x0 + x + run] = 1
+                    x += run
+    return out
+
+def read_cells(path, out=None, x0=0, y0=0):
+    """Lee un fichero de texto plano .cells ('.' muerta, 'O' viva) fila a fila."""
+    # Primera pasada sólo para medir
+    height = width = 0
+    with open(path) as f:
+        for line in f:
+            if not line.startswith('!'):
+                height += 1
+                width = max(width, len(line.rstrip()))
+    out, x0, y0 = _pattern_out(out, height, width, x0, y0)
+    y = y0
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'!'):
+                continue
+            row = np.frombuffer(line.rstrip(), dtype=np.uint8)
+            out[y, x0:x0 + len(row)] = (row == ord('O')) | (row == ord('*'))
+            y += 1
+    return out
+
+def save_snapshot(path, grid, generation=0):
+    """Guarda el tablero con 1 bit por celda.
+
+    Con extensión .npz va comprimido; con cualquier otra es un fichero crudo
+    (cabecera de 32 bytes + filas empaquetadas) que load_snapshot abre con mmap.
+    """
+    grid = np.asarray(grid)
+    height, width = grid.shape
+    if str(path).endswith('.npz'):
+        np.savez_compressed(path, cells=np.packbits(grid, axis=1), width=width, generation=generation)
+        return
+    with open(path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + np.array([height, width, generation], dtype='<i8').tobytes())
+        # Por bloques de filas, para no duplicar un tablero enorme en memoria
+        for y in range(0, height, 1024):
+            f.write(np.packbits(grid[y:y + 1024], axis=1).tobytes())
+
+def load_snapshot(path, out=None):
+    """Devuelve (tablero, generación) de un fichero escrito por save_snapshot."""
+    if str(path).endswith('.npz'):
+        with np.load(path) as data:
+            packed, width, generation = data['cells'], int(data['width']), int(data['generation'])
+    else:
+        with open(path, 'rb') as f:
+            head = f.read(32)
+        if head[:8] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path}: no es una instantánea de conway.py")
+        height, width, generation = np.frombuffer(head[8:], dtype='<i8').tolist()
+        packed = np.memmap(path, dtype=np.uint8, mode='r', offset=32, shape=(height, -(-width // 8)))
+    if out is None:
+        out = np.empty((packed.shape[0], width), dtype=np.uint8)
+    for y in range(0, packed.shape[0], 1024):
+        out[y:y + 1024] = np.unpackbits(packed[y:y + 1024], axis=1, count=width)
+    return out, generation
+
+def load_pattern(path):
+    """Patrón o instantánea según la extensión; devuelve (tablero, generación)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.rle':
+        return read_rle(path), 0
+    if ext == '.cells':
+        return read_cells(path), 0
+    return load_snapshot(path)
+
+class LifeGrid:
+    """Motor vectorizado: arreglo uint8 [y, x] con un marco de ceros como borde muerto.
+
+    Los dos búferes (actual y siguiente) y los de conteo se reservan una sola vez;
+    step() sólo escribe en ellos y los intercambia.
+    """
+    def __init__(self, grid):
+        height, width = np.shape(grid)
+        self._cur = np.zeros((height + 2, width + 2), dtype=np.uint8)
+        self._next = np.zeros_like(self._cur)
+        self._rows = np.empty((height + 2, width), dtype=np.uint8)
+        self._counts = np.empty((height, width), dtype=np.uint8)
+        self.grid = grid
+        self.generation = 0
+
+    @property
+    def grid(self):
+        return self._cur[1:-1, 1:-1]
+
+    @grid.setter
+    def grid(self, grid):
+        self._cur[1:-1, 1:-1] = grid
+
+    def step(self):
+        P, R, C = self._cur, self._rows, self._counts
+        # Suma 3x3 separable: primero por filas y luego por columnas
+        np.add(P[:, :-2], P[:, 1:-1], out=R)
+        np.add(R, P[:, 2:], out=R)
+        np.add(R[:-2], R[1:-1], out=C)
+        np.add(C, R[2:], out=C)
+        alive = P[1:-1, 1:-1]
+        np.subtract(C, alive, out=C)
+        # vecinos | viva == 3  <=>  nace con 3 o sobrevive con 2 o 3
+        np.bitwise_or(C, alive, out=C)
+        np.equal(C, 3, out=self._next[1:-1, 1:-1])
+        self._cur, self._next = self._next, self._cur
+        self.generation += 1
+
+    def advance(self, k):
+        """Avanza 2**k generaciones."""
+        for _ in range(1 << k):
+            self.step()
+
+class BitGrid:
+    """Motor empaquetado: 64 celdas por palabra uint64 (celda x -> bit x % 64 de la palabra x // 64).
+
+    Los vecinos se cuentan en paralelo de bits con sumadores completos, así que
+    cada operación de NumPy avanza 64 celdas. Una fila de palabras a cero arriba
+    y abajo, y los bits sobrantes de la última palabra a cero, hacen de borde muerto.
+    """
+    def __init__(self, grid):
+        self.height, self.width = np.shape(grid)
+        self.words = -(-self.width // 64)
+        self._cur = np.zeros((self.height + 2, self.words), dtype='<u8')
+        self._mask = np.uint64((1 << (self.width % 64 or 64)) - 1)
+        self.grid = grid
+        self.generation = 0
+
+    @property
+    def grid(self):
+        cells = np.unpackbits(self._cur[1:-1].view(np.uint8), axis=1, bitorder='little')
+        return cells[:, :self.width]
+
+    def window(self, x0, y0, x1, y1):
+        """Desempaqueta sólo las palabras que cubren [y0, y1) x [x0, x1)."""
+        w0 = x0 // 64
+        words = self._cur[1 + y0:1 + y1, w0:-(-x1 // 64)]
+        cells = np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=1, bitorder='little')
+        return cells[:, x0 - 64 * w0:x1 - 64 * w0]
+
+    @grid.setter
+    def grid(self, grid):
+        cells = np.zeros((self.height, self.words * 64), dtype=np.uint8)
+        cells[:, :self.width] = grid
+        self._cur[1:-1] = np.packbits(cells, axis=1, bitorder='little').view('<u8')
+
+    def step(self):
+        P = self._cur
+        one, top = np.uint64(1), np.uint64(63)
+        # Vecino oeste (x - 1) y este (x + 1) de cada celda, con acarreo entre palabras
+        west = P << one
+        west[:, 1:] |= P[:, :-1] >> top
+        east = P >> one
+        east[:, :-1] |= P[:, 1:] << top
+
+        # Suma por filas: arriba y abajo 3 celdas (2 bits), la propia fila 2 celdas
+        def row3(r):
+            a, b, c = west[r], P[r], east[r]
+            return a ^ b ^ c, (a & b) | (c & (a ^ b))
+        up0, up1 = row3(slice(0, -2))
+        dn0, dn1 = row3(slice(2, None))
+        a, c = west[1:-1], east[1:-1]
+        mid0, mid1 = a ^ c, a & c
+
+        # Bit 0, bit 1 y "al menos 4" del total
+        sum0 = up0 ^ dn0 ^ mid0
+        carry = (up0 & dn0) | (mid0 & (up0 ^ dn0))
+        sum1 = up1 ^ dn1 ^ mid1 ^ carry
+        ge4 = (up1 & dn1) | (mid1 & carry) | ((up1 ^ dn1) & (mid1 ^ carry))
+
+        alive = P[1:-1]
+        nxt = np.zeros_like(P)
+        nxt[1:-1] = sum1 & ~ge4 & (sum0 | alive)
+        nxt[1:-1, -1] &= self._mask
+        self._cur = nxt
+        self.generation += 1
+
+    def advance(self, k):
+        """Avanza 2**k generaciones."""
+        for _ in range(1 << k):
+            self.step()
+
+def life_rule(P):
+    """Siguiente generación del interior de P (en los dos últimos ejes), que trae una celda de halo."""
+    rows = P[..., :, :-2] + P[..., :, 1:-1] + P[..., :, 2:]
+    alive = P[..., 1:-1, 1:-1]
+    neighbors = rows[..., :-2, :] + rows[..., 1:-1, :] + rows[..., 2:, :] - alive
+    return ((neighbors | alive) == 3).view(np.uint8)
+
+class TiledGrid:
+    """Motor por teselas: sólo recalcula las teselas que cambiaron en la generación
+    anterior y sus 8 vecinas; un tablero quieto no cuesta casi nada.
+
+    Las teselas activas (con su halo) se recogen de una vez mediante vistas con
+    strides y se avanzan en lote. active es el número de teselas recalculadas en
+    el último paso (de tiles en total). Si pasa de DENSE_FRACTION de las teselas
+    se avanza el tablero entero, que con todo activo es más barato.
+    """
+    DENSE_FRACTION = 0.5
+
+    def __init__(self, grid, tile=32):
+        self.height, self.width = np.shape(grid)
+        self.tile = T = tile
+        self.rows, self.cols = -(-self.height // T), -(-self.width // T)
+        self.tiles = self.rows * self.cols
+        # Tablero redondeado a teselas enteras; lo que sobra fuera del mapa se mantiene muerto
+        self._cur = np.zeros((self.rows * T + 2, self.cols * T + 2), dtype=np.uint8)
+        valid = np.zeros((self.rows * T, self.cols * T), dtype=np.uint8)
+        valid[:self.height, :self.width] = 1
+        self._valid, self._valid_tiles = valid, self._tile_view(valid, T)
+        s0, s1 = self._cur.strides
+        self._halos = np.lib.stride_tricks.as_strided(
+            self._cur, (self.rows, self.cols, T + 2, T + 2), (T * s0, T * s1, s0, s1), writeable=False)
+        self._tiles = self._tile_view(self._cur[1:-1, 1:-1], T)
+        self._changed = np.zeros((self.rows + 2, self.cols + 2), dtype=bool)
+        self.grid = grid
+        self.active = 0
+        self.generation = 0
+
+    @staticmethod
+    def _tile_view(a, T):
+        """Vista (fila, columna, T, T) de las teselas de a, sin copiar."""
+        s0, s1 = a.strides
+        return np.lib.stride_tricks.as_strided(a, (a.shape[0] // T, a.shape[1] // T, T, T),
+                                               (T * s0, T * s1, s0, s1))
+
+    @property
+    def grid(self):
+        return self._cur[1:self.height + 1, 1:self.width + 1]
+
+    @grid.setter
+    def grid(self, grid):
+        self._cur[1:self.height + 1, 1:self.width + 1] = grid
+        self._changed[1:-1, 1:-1] = True
+
+    def step(self):
+        # Dilatación 3x3 de las teselas que cambiaron (el marco de _changed siempre es False)
+        c = self._changed
+        near = c[:, :-2] | c[:, 1:-1] | c[:, 2:]
+        ty, tx = np.nonzero(near[:-2] | near[1:-1] | near[2:])
+        self.active = len(ty)
+        c.fill(False)
+        if self.active > self.tiles * self.DENSE_FRACTION:
+            new = life_rule(self._cur)
+            new &= self._valid
+            diff = new != self._cur[1:-1, 1:-1]
+            T = self.tile
+            c[1:-1, 1:-1] = diff.reshape(self.rows, T, -1).any(axis=1).reshape(self.rows, self.cols, T).any(axis=2)
+            self._cur[1:-1, 1:-1] = new
+        elif self.active:
+            new = life_rule(self._halos[ty, tx])
+            new &= self._valid_tiles[ty, tx]
+            changed = (new != self._tiles[ty, tx]).any(axis=(1, 2))
+            ty, tx = ty[changed], tx[changed]
+            # Se escribe después de leer todos los halos de la generación anterior
+            self._tiles[ty, tx] = new[changed]
+            c[ty + 1, tx + 1] = True
+        self.generation += 1
+
+    def advance(self, k):
+        """Avanza 2**k generaciones."""
+        for _ in range(1 << k):
+            self.step()
+
+class Node:
+    __slots__ = ('nw', 'ne', 'sw', 'se', 'level', 'pop')
+
+    def __init__(self, nw, ne, sw, se, level, pop):
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.level = level
+        self.pop = pop
+
+def _life_4x4_table():
+    # Para cada 4x4 codificado en 16 bits (bit 4*fila+col), el 2x2 central tras una generación
+    codes = np.arange(1 << 16)
+    cells = ((codes[:, None] >> np.arange(16)) & 1).reshape(-1, 4, 4)
+    result = np.zeros(len(codes), dtype=np.int64)
+    for bit, (r, c) in enumerate([(1, 1), (1, 2), (2, 1), (2, 2)]):
+        alive = cells[:, r, c]
+        neighbors = cells[:, r - 1:r + 2, c - 1:c + 2].sum(axis=(1, 2)) - alive
+        result |= ((neighbors | alive) == 3).astype(np.int64) << bit
+    return result.tolist()
+
+class HashLife:
+    """Motor HashLife: quadtree con nodos canónicos (hash-consing) y caché de resultados.
 
-    # Dibujar la cuadrícula
+    Simula un plano sin límites; grid es la ventana [0, alto) x [0, ancho) del
+    mapa original, así que lo que sale de ella sigue evolucionando fuera de la vista.
+    La caché de resultados descarta sus entradas más antiguas al superar cache_size,
+    y la tabla de nodos se recolecta (sólo lo alcanzable desde la raíz) al superar max_nodes.
+    """
+    LIFE_4X4 = None
+
+    def __init__(self, grid, cache_size=1 << 20, max_nodes=1 << 22):
+        if HashLife.LIFE_4X4 is None:
+            HashLife.LIFE_4X4 = _life_4x4_table()
+        self.cache_size = cache_size
+        self.max_nodes = max_nodes
+        self._nodes = {}
+        self._results = {}
+        self._off = Node(None, None, None, None, 0, 0)
+        self._on = Node(None, None, None, None, 0, 1)
+        self._empty = [self._off]
+        self._level1 = [self.join(*(self._on if q >> b & 1 else self._off for b in range(4)))
+                        for q in range(16)]
+        self.height, self.width = np.shape(grid)
+        self._out = None   # grid completo, sólo si alguien lo pide
+        self.grid = grid
+        self.generation = 0
+
+    # --- nodos canónicos ---
+    def join(self, nw, ne, sw, se):
+        key = (nw, ne, sw, se)
+        node = self._nodes.get(key)
+        if node is None:
+            node = Node(nw, ne, sw, se, nw.level + 1, nw.pop + ne.pop + sw.pop + se.pop)
+            self._nodes[key] = node
+        return node
+
+    def empty(self, level):
+        while len(self._empty) <= level:
+            e = self._empty[-1]
+            self._empty.append(self.join(e, e, e, e))
+        return self._empty[level]
+
+    def _expand(self, node, x, y):
+        """Centra node en un nodo del nivel siguiente; devuelve el nodo y su nueva esquina."""
+        e = self.empty(node.level - 1)
+        half = 1 << (node.level - 1)
+        return (self.join(self.join(e, e, e, node.nw), self.join(e, e, node.ne, e),
+                          self.join(e, node.sw, e, e), self.join(node.se, e, e, e)),
+                x - half, y - half)
+
+    @staticmethod
+    def _centred(node):
+        """True si toda la población cae en el cuarto central del nodo."""
+        return node.nw.se.pop + node.ne.sw.pop + node.sw.ne.pop + node.se.nw.pop == node.pop
+
+    # --- evolución ---
+    def _life_4x4(self, m):
+        code = 0
+        for i, quad in enumerate((m.nw, m.ne, m.sw, m.se)):
+            base = (i >> 1) * 8 + (i & 1) * 2
+            code |= (quad.nw.pop << base) | (quad.ne.pop << (base + 1)) \
+                | (quad.sw.pop << (base + 4)) | (quad.se.pop << (base + 5))
+        return self._level1[self.LIFE_4X4[code]]
+
+    def _successor(self, m, j):
+        """Nodo central (nivel - 1) de m avanzado 2**j generaciones, j <= nivel - 2."""
+        if m.pop == 0:
+            return m.nw
+        j = min(j, m.level - 2)
+        key = (m, j)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+        if m.level == 2:
+            result = self._life_4x4(m)
+        else:
+            join, succ = self.join, self._successor
+            a, b, c, d = m.nw, m.ne, m.sw, m.se
+            c1 = succ(a, j)
+            c2 = succ(join(a.ne, b.nw, a.se, b.sw), j)
+            c3 = succ(b, j)
+            c4 = succ(join(a.sw, a.se, c.nw, c.ne), j)
+            c5 = succ(join(a.se, b.sw, c.ne, d.nw), j)
+            c6 = succ(join(b.sw, b.se, d.nw, d.ne), j)
+            c7 = succ(c, j)
+            c8 = succ(join(c.ne, d.nw, c.se, d.sw), j)
+            c9 = succ(d, j)
+            if j < m.level - 2:
+                # Basta con el centro de cada resultado intermedio
+                result = join(join(c1.se, c2.sw, c4.ne, c5.nw), join(c2.se, c3.sw, c5.ne, c6.nw),
+                              join(c4.se, c5.sw, c7.ne, c8.nw), join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:
+                result = join(succ(join(c1, c2, c4, c5), j), succ(join(c2, c3, c5, c6), j),
+                              succ(join(c4, c5, c7, c8), j), succ(join(c5, c6, c8, c9), j))
+        self._results[key] = result
+        if len(self._results) > self.cache_size:
+            for old in list(itertools.islice(self._results, len(self._results) // 4)):
+                del self._results[old]
+        return result
+
+    def advance(self, k):
+        """Avanza 2**k generaciones de una vez."""
+        root, x, y = self.root, self._x, self._y
+        while root.level < k + 2 or not self._centred(root):
+            root, x, y = self._expand(root, x, y)
+        root, x, y = self._expand(root, x, y)
+        half = 1 << (root.level - 2)
+        self.root = self._successor(root, k)
+        self._x, self._y = x + half, y + half
+        self.generation += 1 << k
+        if len(self._nodes) > self.max_nodes:
+            self.collect()
+
+    def step(self):
+        self.advance(0)
+
+    def collect(self):
+        """Rehace la tabla de nodos con lo alcanzable desde la raíz y vacía la caché de resultados."""
+        self._results.clear()
+        nodes = {}
+        stack = [self.root] + self._empty + self._level1
+        while stack:
+            node = stack.pop()
+            if node.level == 0:
+                continue
+            key = (node.nw, node.ne, node.sw, node.se)
+            if key not in nodes:
+                nodes[key] = node
+                stack.extend(key)
+        self._nodes = nodes
+
+    # --- conversión desde/hacia la cuadrícula densa ---
+    def _from_array(self, a, level):
+        if level == 0:
+            return self._on if a[0, 0] else self._off
+        if not a.any():
+            return self.empty(level)
+        h = 1 << (level - 1)
+        return self.join(self._from_array(a[:h, :h], level - 1), self._from_array(a[:h, h:], level - 1),
+                         self._from_array(a[h:, :h], level - 1), self._from_array(a[h:, h:], level - 1))
+
+    def _paint(self, out, node, x, y):
+        size = 1 << node.level
+        if node.pop == 0 or x >= out.shape[1] or y >= out.shape[0] or x + size <= 0 or y + size <= 0:
+            return
+        if node.level == 0:
+            out[y, x] = 1
+            return
+        h = size >> 1
+        self._paint(out, node.nw, x, y)
+        self._paint(out, node.ne, x + h, y)
+        self._paint(out, node.sw, x, y + h)
+        self._paint(out, node.se, x + h, y + h)
+
+    def window(self, x0, y0, x1, y1):
+        """Pinta sólo la ventana [y0, y1) x [x0, x1) del mapa, sin tocar el resto."""
+        out = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        self._paint(out, self.root, self._x - x0, self._y - y0)
+        return out
+
+    @property
+    def population(self):
+        return self.root.pop
+
+    @property
+    def grid(self):
+        if self._out is None:
+            self._out = np.zeros((self.height, self.width), dtype=np.uint8)
+        self._out.fill(0)
+        self._paint(self._out, self.root, self._x, self._y)
+        return self._out
+
+    @grid.setter
+    def grid(self, grid):
+        grid = np.asarray(grid, dtype=np.uint8)
+        level = max(2, int(np.ceil(np.log2(max(grid.shape)))))
+        square = np.zeros((1 << level, 1 << level), dtype=np.uint8)
+        square[:grid.shape[0], :grid.shape[1]] = grid
+        self.root = self._from_array(square, level)
+        self._x = self._y = 0
+
+def _bands_worker(conn, shm_name, shape, r0, r1, halo):
+    """Avanza las filas [r0, r1) leyendo además halo filas a cada lado del tablero compartido."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # el padre gestiona Ctrl+C
+    shm = shared_memory.SharedMemory(name=shm_name)
+    boards = np.ndarray((2,) + shape, np.uint8, shm.buf)
+    top, bottom = max(0, r0 - halo), min(shape[0], r1 + halo)
+    # Los bordes de local contaminan una fila de halo por generación; tras
+    # gens <= halo generaciones la banda propia sigue siendo exacta
+    local = LifeGrid(np.zeros((bottom - top, shape[1]), dtype=np.uint8))
+    while True:
+        cmd, gens, src = conn.recv()
+        if cmd == 'stop':
+            break
+        local.grid = boards[src, top:bottom]
+        for _ in range(gens):
+            local.step()
+        boards[1 - src, r0:r1] = local.grid[r0 - top:r1 - top]
+        conn.send(None)
+    del boards
+    shm.close()
+
+class BandedGrid:
+    """Motor multiproceso: el tablero vive en memoria compartida (dos búferes) y
+    cada trabajador avanza una banda horizontal de filas.
+
+    En cada sincronización un trabajador copia su banda más halo filas de cada
+    vecina y avanza hasta halo generaciones sin volver a hablar con nadie, así
+    que step() avanza halo generaciones por sincronización.
+    """
+    def __init__(self, grid, workers=None, halo=1):
+        height, width = np.shape(grid)
+        workers = min(workers or os.cpu_count(), height)
+        self.halo = halo
+        # El padre crea y libera (unlink) el bloque; los trabajadores sólo se adjuntan
+        self.shm = shared_memory.SharedMemory(create=True, size=2 * height * width)
+        self._boards = np.ndarray((2, height, width), np.uint8, self.shm.buf)
+        self._src = 0
+        self.grid = grid
+        self.generation = 0
+        self.conns, self.procs = [], []
+        bounds = np.linspace(0, height, workers + 1).astype(int)
+        for r0, r1 in zip(bounds[:-1], bounds[1:]):
+            parent, child = mp.Pipe()
+            p = mp.Process(target=_bands_worker, daemon=True,
+                           args=(child, self.shm.name, (height, width), int(r0), int(r1), halo))
+            p.start()
+            self.conns.append(parent)
+            self.procs.append(p)
+
+    @property
+    def grid(self):
+        return self._boards[self._src]
+
+    @grid.setter
+    def grid(self, grid):
+        self._boards[self._src] = grid
+
+    def run(self, gens):
+        """Avanza gens generaciones en sincronizaciones de hasta halo generaciones."""
+        while gens > 0:
+            n = min(gens, self.halo)
+            for conn in self.conns:
+                conn.send(('step', n, self._src))
+            for conn in self.conns:
+                conn.recv()
+            self._src ^= 1
+            self.generation += n
+            gens -= n
+
+    def step(self):
+        self.run(self.halo)
+
+    def advance(self, k):
+        """Avanza 2**k generaciones."""
+        self.run(1 << k)
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(('stop', 0, 0))
+        for p in self.procs:
+            p.join()
+        del self._boards
+        self.shm.close()
+        self.shm.unlink()
+
+ENGINES = {'numpy': LifeGrid, 'bits': BitGrid, 'tiles': TiledGrid, 'hashlife': HashLife,
+           'bands': BandedGrid}
+
+# --------------------
+# Visor
+# --------------------
+def main():
+    parser = argparse.ArgumentParser(description="Juego de la vida de Conway")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='numpy')
+    parser.add_argument('--width', type=int, default=MAP_WIDTH)
+    parser.add_argument('--height', type=int, default=MAP_HEIGHT)
+    parser.add_argument('--workers', type=int, default=None, help="procesos del motor bands (por defecto, uno por núcleo)")
+    parser.add_argument('--halo', type=int, default=1, help="filas de halo (= generaciones por sincronización) del motor bands")
+    parser.add_argument('--skip', type=int, default=0, metavar='K',
+                        help="avanzar 2**K generaciones por fotograma (pensado para hashlife)")
+    parser.add_argument('--pattern', help="fichero .rle, .cells o instantánea (.npz / crudo) con el que empezar")
+    parser.add_argument('--save', default='conway_snapshot.npz',
+                        help="instantánea que se escribe al pulsar G (.npz comprimido o crudo para mmap)")
+    args = parser.parse_args()
+
+    generation = 0
+    if args.pattern and os.path.splitext(args.pattern)[1].lower() in ('.rle', '.cells'):
+        pattern, _ = load_pattern(args.pattern)
+        ph, pw = pattern.shape
+        map_w, map_h = max(args.width, pw), max(args.height, ph)
+        grid = np.zeros((map_h, map_w), dtype=np.uint8)
+        y0, x0 = (map_h - ph) // 2, (map_w - pw) // 2
+        grid[y0:y0 + ph, x0:x0 + pw] = pattern
+    elif args.pattern:
+        grid, generation = load_snapshot(args.pattern)
+        map_h, map_w = grid.shape
+    else:
+        map_w, map_h = args.width, args.height
+        grid = random_grid(map_w, map_h)
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    clock = pygame.time.Clock()
+
+    if args.engine == 'bands':
+        life = BandedGrid(grid, args.workers, args.halo)
+    else:
+        life = ENGINES[args.engine](grid)
+    life.generation = generation
+
+    # Offset para mover el mapa
+    offset_x = 0
+    offset_y = 0
+
+    # Superficies de dibujo: la parte visible del mapa se compone como imagen
+    # (una celda = un píxel) y la cuadrícula se dibuja una sola vez
+    view_surf = pygame.Surface((WIDTH // CELL_SIZE + 1, HEIGHT // CELL_SIZE + 1))
+    grid_surf = pygame.Surface((WIDTH, HEIGHT))
+    grid_surf.set_colorkey(BLACK)
     for x in range(0, WIDTH, CELL_SIZE):
-        pygame.draw.line(screen, GRID_COLOR, (x, 0), (x, HEIGHT))
+        pygame.draw.line(grid_surf, GRID_COLOR, (x, 0), (x, HEIGHT))
     for y in range(0, HEIGHT, CELL_SIZE):
-        pygame.draw.line(screen, GRID_COLOR, (0, y), (WIDTH, y))
+        pygame.draw.line(grid_surf, GRID_COLOR, (0, y), (WIDTH, y))
+
+    def blit_map():
+        # Sólo se recorta, colorea y escala la parte del mapa que cae dentro de
+        # la ventana (grid está indexado [y, x]; surfarray espera [x, y])
+        x0, y0 = max(0, -offset_x // CELL_SIZE), max(0, -offset_y // CELL_SIZE)
+        x1 = min(map_w, (WIDTH - offset_x) // CELL_SIZE + 1)
+        y1 = min(map_h, (HEIGHT - offset_y) // CELL_SIZE + 1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        if hasattr(life, 'window'):
+            cells = life.window(x0, y0, x1, y1)
+        else:
+            cells = life.grid[y0:y1, x0:x1]
+        visible = view_surf.subsurface((0, 0, x1 - x0, y1 - y0))
+        pygame.surfarray.blit_array(visible, PALETTE[cells.T])
+        scaled = pygame.transform.scale(visible, ((x1 - x0) * CELL_SIZE, (y1 - y0) * CELL_SIZE))
+        screen.blit(scaled, (x0 * CELL_SIZE + offset_x, y0 * CELL_SIZE + offset_y))
+
+    running = True
+    while running:
+        clock.tick(FPS)
+        screen.fill(BLACK)
+
+        # Eventos
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_g:
+                save_snapshot(args.save, life.grid, life.generation)
+                print(f"Instantánea de la generación {life.generation} guardada en {args.save}")
+
+        # Movimiento con teclas
+        keys = pygame.key.get_pressed()
+        if keys[pygame.K_w]:
+            offset_y += move_speed
+        if keys[pygame.K_s]:
+            offset_y -= move_speed
+        if keys[pygame.K_a]:
+            offset_x += move_speed
+        if keys[pygame.K_d]:
+            offset_x -= move_speed
+
+        # Dibujar
+        blit_map()
+
+        # Dibujar la cuadrícula
+        screen.blit(grid_surf, (0, 0))
+
+        life.advance(args.skip)
+        caption = f"Generación {life.generation}"
+        if hasattr(life, 'active'):
+            caption += f" - teselas activas {life.active}/{life.tiles}"
+        pygame.display.set_caption(caption)
+        pygame.display.flip()
 
-    update_grid()
-    pygame.display.flip()
+    if hasattr(life, 'close'):
+        life.close()
+    pygame.quit()
 
-pygame.quit()
+if __name__ == '__main__':
+    main()
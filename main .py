@@ -32,7 +32,9 @@ reloj = pygame.time.Clock()
 MAX_COLUMNAS = (ANCHO_VENTANA // TAMANO_CELDA) - 1
 MAX_FILAS = ((ALTO_VENTANA - STATS_ALTO) // TAMANO_CELDA) - 1
 
-total_elementos = []  # Lista global de elementos
+total_elementos = {}  # Elementos vivos, en orden de dibujo (dict como conjunto ordenado)
+mapa_elementos = {}   # (x, y) -> elemento que ocupa esa celda
+celdas_sucias = set() # Celdas cuyo dibujo cambió desde el último fotograma
 
 # Clases
 class RecursoCelda:
@@ -113,15 +115,23 @@ class Personaje:
         self.stats[stat] += cantidad
         elemento.capacidad -= cantidad
         elemento.ultima_interaccion = current_time
+        celdas_sucias.update(elemento.posiciones)
 
         # Si el recurso se agota, lo eliminamos
         if elemento.capacidad <= 0:
-            total_elementos.remove(elemento)
+            quitar_elemento(elemento)
+
+def quitar_elemento(elemento):
+    del total_elementos[elemento]
+    for pos in elemento.posiciones:
+        del mapa_elementos[pos]
+        celdas_sucias.add(pos)
 
 # Generación de elementos
 def generar_elementos():
-    elementos = []
-    celdas_ocupadas = set()
+    """Devuelve los elementos y el índice celda -> elemento que usan las colisiones."""
+    elementos = {}
+    celdas_ocupadas = {}
 
     # Ríos (cada celda como recurso independiente)
     for _ in range(random.randint(1, 3)):
@@ -134,8 +144,8 @@ def generar_elementos():
             continue
         for (cx, cy) in celdas:
             recurso = RecursoCelda(cx, cy, capacidad_max=3000, color=COLOR_RIO)
-            elementos.append(recurso)
-            celdas_ocupadas.add((cx, cy))
+            elementos[recurso] = None
+            celdas_ocupadas[(cx, cy)] = recurso
 
     # Árboles (sin barra de recurso)
     for _ in range(random.randint(4, 14)):
@@ -145,9 +155,9 @@ def generar_elementos():
         if any(pos in celdas_ocupadas for pos in posiciones):
             continue
         arbol = Arbol(x, y)
-        elementos.append(arbol)
+        elementos[arbol] = None
         for pos in arbol.posiciones:
-            celdas_ocupadas.add(pos)
+            celdas_ocupadas[pos] = arbol
 
     # Arbustos (2 celdas independientes)
     for _ in range(random.randint(10, 20)):
@@ -157,46 +167,65 @@ def generar_elementos():
             continue
         for cx in (x, x+1):
             recurso = RecursoCelda(cx, y, capacidad_max=500, color=COLOR_ARBUSTO)
-            elementos.append(recurso)
-            celdas_ocupadas.add((cx, y))
+            elementos[recurso] = None
+            celdas_ocupadas[(cx, y)] = recurso
 
-    return elementos
+    return elementos, celdas_ocupadas
 
 # Dibujado
-def dibujar_cuadricula():
+# El terreno (fondo, cuadrícula y elementos) se pinta una vez en capa_estatica;
+# cada fotograma sólo se recomponen y se envían a pantalla los rects que cambiaron.
+capa_fondo = pygame.Surface((ANCHO_VENTANA, ALTO_VENTANA))
+capa_estatica = pygame.Surface((ANCHO_VENTANA, ALTO_VENTANA))
+textos = {}             # (nombre, valor) -> superficie ya renderizada
+pos_dibujada = None     # Celda del personaje en pantalla
+stats_dibujados = None  # Stats que muestra el panel
+
+def rect_celda(x, y):
+    return pygame.Rect(x * TAMANO_CELDA, STATS_ALTO + y * TAMANO_CELDA, TAMANO_CELDA, TAMANO_CELDA)
+
+def dibujar_cuadricula(superficie):
     for x in range(0, ANCHO_VENTANA, TAMANO_CELDA):
-        pygame.draw.line(ventana, COLOR_LINEAS, (x, STATS_ALTO), (x, ALTO_VENTANA))
+        pygame.draw.line(superficie, COLOR_LINEAS, (x, STATS_ALTO), (x, ALTO_VENTANA))
     for y in range(STATS_ALTO, ALTO_VENTANA, TAMANO_CELDA):
-        pygame.draw.line(ventana, COLOR_LINEAS, (0, y), (ANCHO_VENTANA, y))
-
-
-def dibujar_elementos():
-    for elemento in total_elementos:
-        for (x, y) in elemento.posiciones:
+        pygame.draw.line(superficie, COLOR_LINEAS, (0, y), (ANCHO_VENTANA, y))
+
+def dibujar_celda_elemento(superficie, elemento, x, y):
+    pygame.draw.rect(superficie, elemento.color, rect_celda(x, y))
+    if isinstance(elemento, RecursoCelda):
+        porcentaje = elemento.capacidad / elemento.capacidad_max
+        if porcentaje < 1.0:
+            largo = math.ceil(TAMANO_CELDA * porcentaje)
             pygame.draw.rect(
-                ventana,
-                elemento.color,
+                superficie,
+                COLOR_BARRA,
                 (
                     x * TAMANO_CELDA,
-                    STATS_ALTO + y * TAMANO_CELDA,
-                    TAMANO_CELDA,
-                    TAMANO_CELDA
+                    STATS_ALTO + y * TAMANO_CELDA + TAMANO_CELDA - 3,
+                    largo,
+                    3
                 )
             )
-            if isinstance(elemento, RecursoCelda):
-                porcentaje = elemento.capacidad / elemento.capacidad_max
-                if porcentaje < 1.0:
-                    largo = math.ceil(TAMANO_CELDA * porcentaje)
-                    pygame.draw.rect(
-                        ventana,
-                        COLOR_BARRA,
-                        (
-                            x * TAMANO_CELDA,
-                            STATS_ALTO + y * TAMANO_CELDA + TAMANO_CELDA - 3,
-                            largo,
-                            3
-                        )
-                    )
+
+def dibujar_elementos(superficie):
+    for elemento in total_elementos:
+        for (x, y) in elemento.posiciones:
+            dibujar_celda_elemento(superficie, elemento, x, y)
+
+def construir_capas():
+    capa_fondo.fill(COLOR_FONDO)
+    dibujar_cuadricula(capa_fondo)
+    capa_estatica.blit(capa_fondo, (0, 0))
+    dibujar_elementos(capa_estatica)
+
+def redibujar_celda(pos):
+    """Repinta una celda en capa_estatica y devuelve su rect."""
+    rect = rect_celda(*pos)
+    capa_estatica.blit(capa_fondo, rect, rect)
+    elemento = mapa_elementos.get(pos)
+    if elemento is not None:
+        dibujar_celda_elemento(capa_estatica, elemento, *pos)
+    return rect
 
 # Sombrea circular alrededor del personaje
 def dibujar_sombra():
@@ -205,6 +234,12 @@ def dibujar_sombra():
     radius = TAMANO_CELDA * 3
     pygame.draw.circle(ventana, (0, 0, 0), (center_x, center_y), radius, width=3)
 
+def rect_sombra(x, y):
+    radio = TAMANO_CELDA * 3 + 1
+    rect = pygame.Rect(0, 0, 2 * radio, 2 * radio)
+    rect.center = rect_celda(x, y).center
+    return rect.clip(ventana.get_rect())
+
 
 def dibujar_personaje():
     x = personaje.x * TAMANO_CELDA
@@ -216,10 +251,43 @@ def dibujar_stats():
     pygame.draw.rect(ventana, COLOR_STATS, (0, 0, ANCHO_VENTANA, STATS_ALTO))
     x_pos, y_pos = 20, 15
     for nombre, valor in personaje.stats.items():
-        texto = fuente.render(f"{nombre.capitalize()}: {valor}%", True, COLOR_TEXTO)
+        texto = textos.get((nombre, valor))
+        if texto is None:
+            texto = textos[(nombre, valor)] = fuente.render(f"{nombre.capitalize()}: {valor}%", True, COLOR_TEXTO)
         ventana.blit(texto, (x_pos, y_pos))
         x_pos += 150
 
+def dibujar_todo():
+    global pos_dibujada, stats_dibujados
+    ventana.blit(capa_estatica, (0, 0))
+    dibujar_sombra()
+    dibujar_personaje()
+    dibujar_stats()
+    pos_dibujada = (personaje.x, personaje.y)
+    stats_dibujados = dict(personaje.stats)
+
+def dibujar_cambios():
+    """Recompone lo que cambió desde el último fotograma y devuelve los rects a actualizar."""
+    global pos_dibujada, stats_dibujados
+    sucios = [redibujar_celda(pos) for pos in celdas_sucias]
+    celdas_sucias.clear()
+    pos = (personaje.x, personaje.y)
+    if pos != pos_dibujada:
+        sucios += [rect_sombra(*pos_dibujada), rect_sombra(*pos)]
+        pos_dibujada = pos
+    for rect in sucios:
+        ventana.blit(capa_estatica, rect, rect)
+    if sucios:
+        # Repintar encima lo que pudo quedar tapado
+        dibujar_sombra()
+        dibujar_personaje()
+    panel = pygame.Rect(0, 0, ANCHO_VENTANA, STATS_ALTO)
+    if personaje.stats != stats_dibujados or panel.collidelist(sucios) != -1:
+        dibujar_stats()
+        sucios.append(panel)
+        stats_dibujados = dict(personaje.stats)
+    return sucios
+
 # Movimiento
 teclas_activas = {K_w: {'inicio': 0, 'ultimo_mov': 0},
                   K_s: {'inicio': 0, 'ultimo_mov': 0},
@@ -237,13 +305,10 @@ def manejar_movimiento(tecla, current_time):
     elif tecla == K_d and nueva_x < MAX_COLUMNAS:
         nueva_x += 1
 
-    colision = False
-    for elemento in total_elementos:
-        if (nueva_x, nueva_y) in elemento.posiciones:
-            colision = True
-            if isinstance(elemento, RecursoCelda):
-                personaje.interactuar_con_elemento(elemento, pygame.time.get_ticks())
-            break
+    elemento = mapa_elementos.get((nueva_x, nueva_y))
+    colision = elemento is not None
+    if isinstance(elemento, RecursoCelda):
+        personaje.interactuar_con_elemento(elemento, pygame.time.get_ticks())
 
     if not colision:
         personaje.x, personaje.y = nueva_x, nueva_y
@@ -252,9 +317,12 @@ def manejar_movimiento(tecla, current_time):
 
 # Inicialización y bucle principal
 personaje = Personaje(MAX_COLUMNAS // 2, MAX_FILAS // 2)
-total_elementos = generar_elementos()
+total_elementos, mapa_elementos = generar_elementos()
 
 def main():
+    construir_capas()
+    dibujar_todo()
+    pygame.display.update()
     while True:
         current_time = pygame.time.get_ticks()
 
@@ -280,15 +348,9 @@ def main():
                         if manejar_movimiento(tecla, current_time):
                             teclas_activas[tecla]['ultimo_mov'] = current_time
 
-        # Actualizar stats y dibujar
+        # Actualizar stats y dibujar sólo lo que cambió
         personaje.actualizar_stats(current_time)
-        ventana.fill(COLOR_FONDO)
-        dibujar_cuadricula()
-        dibujar_elementos()
-        dibujar_sombra()
-        dibujar_personaje()
-        dibujar_stats()
-        pygame.display.update()
+        pygame.display.update(dibujar_cambios())
         reloj.tick(60)
 
 if __name__ == "__main__":
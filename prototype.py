@@ -1,5 +1,8 @@
+import heapq
+import itertools
 import pygame
 import random
+import time
 import numpy as np
 import os
 
@@ -12,13 +15,18 @@ MAP_WIDTH = 100
 MAP_HEIGHT = 100
 MAX_AGENTS = 200
 
-# Tiempos en milisegundos
+# Tiempos en milisegundos (de simulación: cada tick avanza TICK_MS)
+TICK_MS = 1000 // FPS
 BUSH_REGEN_TIME = 10000
 MIN_LIFESPAN = 120000
 MAX_LIFESPAN = 240000
 
 BEST_BRAIN_FILE = 'best_brain.npz'
 
+# Ticks por cuadro: teclas 1 (1x), 2 (10x), 3 (100x), 4 (auto) y 0 (sin dibujo)
+SPEED_KEYS = {pygame.K_1: 1, pygame.K_2: 10, pygame.K_3: 100, pygame.K_4: 'auto', pygame.K_0: 'off'}
+FRAME_BUDGET = 0.8 / FPS
+
 # Colores
 BLACK = (0, 0, 0)
 BUSH_COLOR = (0, 200, 0)
@@ -36,14 +44,42 @@ pygame.init()
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 clock = pygame.time.Clock()
 
+# Superficies de dibujo: el mapa se compone como imagen RGB (una celda = un
+# píxel, indexada [x, y]) y la cuadrícula se dibuja una sola vez
+map_rgb = np.zeros((MAP_WIDTH, MAP_HEIGHT, 3), dtype=np.uint8)
+map_surf = pygame.Surface((MAP_WIDTH, MAP_HEIGHT))
+grid_surf = pygame.Surface((WIDTH, HEIGHT))
+grid_surf.set_colorkey(BLACK)
+for x in range(0, WIDTH, CELL_SIZE):
+    pygame.draw.line(grid_surf, GRID_COLOR, (x, 0), (x, HEIGHT))
+for y in range(0, HEIGHT, CELL_SIZE):
+    pygame.draw.line(grid_surf, GRID_COLOR, (0, y), (WIDTH, y))
+
+def blit_map():
+    # Sólo se escala la parte del mapa que cae dentro de la ventana
+    x0, y0 = max(0, -offset_x // CELL_SIZE), max(0, -offset_y // CELL_SIZE)
+    x1 = min(MAP_WIDTH, (WIDTH - offset_x) // CELL_SIZE + 1)
+    y1 = min(MAP_HEIGHT, (HEIGHT - offset_y) // CELL_SIZE + 1)
+    if x0 >= x1 or y0 >= y1:
+        return
+    visible = map_surf.subsurface((x0, y0, x1 - x0, y1 - y0))
+    scaled = pygame.transform.scale(visible, ((x1 - x0) * CELL_SIZE, (y1 - y0) * CELL_SIZE))
+    screen.blit(scaled, (x0 * CELL_SIZE + offset_x, y0 * CELL_SIZE + offset_y))
+
 offset_x = 0
 offset_y = 0
 move_speed = 10
 
+sim_time = 0            # reloj de simulación en ms
+speed = 1               # ticks por cuadro, 'auto' u 'off'
+tick_s = None           # media móvil de segundos por tick (modo 'auto')
+
 # Recursos
 bushes = {(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT)) for _ in range(50)}
 lakes = {(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT)) for _ in range(30)}
-bush_regen = []
+bush_regen = []            # montículo de (tiempo, posición)
+deaths = []                # montículo de (tiempo, orden, agente, vida) para la muerte por edad
+death_order = itertools.count()
 
 # Seguimiento del mejor cerebro
 best_age = 0
@@ -77,26 +113,38 @@ class SimpleBrain:
         self.W2 += np.random.randn(*self.W2.shape) * 0.05
 
     def copy(self):
-        new = SimpleBrain()
-        new.W1 = self.W1.copy()
-        new.W2 = self.W2.copy()
+        return SimpleBrain.view(self.W1.copy(), self.W2.copy())
+
+    @classmethod
+    def view(cls, W1, W2):
+        """Cerebro sobre pesos ya existentes (sin copiarlos ni sortear otros)."""
+        new = cls.__new__(cls)
+        new.W1, new.W2 = W1, W2
         return new
 
 # Agente inteligente
 class AgentCell:
-    def __init__(self, x, y, brain=None):
+    def __init__(self, x, y, brain=None, copy_brain=True):
+        self.brain = (brain.copy() if copy_brain else brain) if brain else SimpleBrain()
+        self.life = 0   # cuántas veces se ha usado este objeto (ver AgentPool)
+        self.respawn(x, y)
+
+    def respawn(self, x, y):
+        """Estado de un agente recién nacido en (x, y); el cerebro no se toca."""
         self.x = x
         self.y = y
         self.hunger = 100.0
         self.thirst = 100.0
-        self.birth_time = pygame.time.get_ticks()
+        self.birth_time = sim_time
         self.life_span = random.uniform(MIN_LIFESPAN, MAX_LIFESPAN)
-        self.brain = brain.copy() if brain else SimpleBrain()
         self.alive = True
+        self.life += 1
+        # Muere en el primer tick en que age > life_span
+        heapq.heappush(deaths, (self.birth_time + self.life_span, next(death_order), self, self.life))
 
     @property
     def age(self):
-        return pygame.time.get_ticks() - self.birth_time
+        return sim_time - self.birth_time
 
     @property
     def stage(self):
@@ -131,10 +179,6 @@ class AgentCell:
         if not self.alive:
             return
 
-        if self.age > self.life_span:
-            self.die()
-            return
-
         action = int(np.argmax(self.brain.forward(self.sense())))
         moves = [(0,0),(0,-1),(0,1),(-1,0),(1,0),(0,0)]  # (quieto, arriba, abajo, izq, der, ataque)
         dx, dy = moves[action] if 0 <= action < len(moves) else (0,0)
@@ -144,7 +188,7 @@ class AgentCell:
         if (self.x, self.y) in bushes:
             self.hunger = min(100, self.hunger + 50)
             bushes.remove((self.x, self.y))
-            bush_regen.append(((self.x, self.y), pygame.time.get_ticks() + BUSH_REGEN_TIME))
+            heapq.heappush(bush_regen, (sim_time + BUSH_REGEN_TIME, (self.x, self.y)))
         if (self.x, self.y) in lakes:
             self.thirst = min(100, self.thirst + 50)
 
@@ -175,48 +219,69 @@ class AgentCell:
         return self.alive and self.stage == 'adult' and self.hunger > 70 and self.thirst > 70
 
     def reproduce(self):
-        child = AgentCell(self.x, self.y, brain=self.brain)
-        child.brain.mutate()
+        child = pool.spawn(self.x, self.y, self.brain)   # se muta en pool.mutate()
         self.hunger -= 30
         self.thirst -= 30
         return child
 
+class AgentPool:
+    """
+    AgentCell preasignados. Los pesos están apilados en bloques y cada cerebro
+    es una vista sobre su fila: nacer copia el cerebro del padre en una ranura
+    libre sin crear objetos ni arreglos nuevos.
+    """
+    def __init__(self, block=MAX_AGENTS):
+        self.block = block
+        self.free = []
+
+    def _grow(self):
+        W1 = np.empty((self.block, 10, 6))
+        W2 = np.empty((self.block, 6, 6))
+        for i in range(self.block):
+            agent = AgentCell.__new__(AgentCell)
+            agent.brain = SimpleBrain.view(W1[i], W2[i])
+            agent.life, agent.alive = 0, False
+            self.free.append(agent)
+
+    def spawn(self, x, y, brain=None):
+        if not self.free:
+            self._grow()
+        agent = self.free.pop()
+        agent.respawn(x, y)
+        src = brain or SimpleBrain()
+        np.copyto(agent.brain.W1, src.W1)
+        np.copyto(agent.brain.W2, src.W2)
+        return agent
+
+    def mutate(self, children):
+        """La mutación de todas las crías del tick, sorteada de una vez."""
+        if children:
+            noise1 = np.random.randn(len(children), 10, 6) * 0.05
+            noise2 = np.random.randn(len(children), 6, 6) * 0.05
+            for child, d1, d2 in zip(children, noise1, noise2):
+                child.brain.W1 += d1
+                child.brain.W2 += d2
+
+    def release(self, agents):
+        self.free.extend(agents)
+
+pool = AgentPool()
+
 # Cargar cerebro si existe
 best_brain = load_brain()
 
 # Crear agentes iniciales
-if best_brain:
-    agent_cells = [AgentCell(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT), brain=best_brain) for _ in range(20)]
-else:
-    agent_cells = [AgentCell(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT)) for _ in range(20)]
-
-# Bucle principal
-running = True
-while running:
-    clock.tick(FPS)
-    now = pygame.time.get_ticks()
-    screen.fill(BLACK)
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_w: offset_y += move_speed
-            if event.key == pygame.K_s: offset_y -= move_speed
-            if event.key == pygame.K_a: offset_x += move_speed
-            if event.key == pygame.K_d: offset_y -= move_speed
-        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            mx, my = pygame.mouse.get_pos()
-            gx = int((mx - offset_x) / CELL_SIZE)
-            gy = int((my - offset_y) / CELL_SIZE)
-            if 0 <= gx < MAP_WIDTH and 0 <= gy < MAP_HEIGHT:
-                agent_cells.append(AgentCell(gx, gy, brain=best_brain if best_brain else None))
-
-    # Regenerar arbustos
-    for pos, regen_time in bush_regen[:]:
-        if now >= regen_time:
-            bushes.add(pos)
-            bush_regen.remove((pos, regen_time))
+agent_cells = [pool.spawn(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT), best_brain) for _ in range(20)]
+
+def step_simulation():
+    global agent_cells, sim_time
+    # Regenerar arbustos y matar a los que cumplen su vida: sólo lo que vence ahora
+    while bush_regen and bush_regen[0][0] <= sim_time:
+        bushes.add(heapq.heappop(bush_regen)[1])
+    while deaths and deaths[0][0] < sim_time:
+        _, _, agent, life = heapq.heappop(deaths)
+        if agent.alive and agent.life == life:   # el objeto pudo reutilizarse para otro agente
+            agent.die()
 
     # Mover agentes y reproducir
     children = []
@@ -224,34 +289,80 @@ while running:
         agent.move()
         if agent.can_reproduce():
             children.append(agent.reproduce())
+    pool.mutate(children)
 
+    # Los muertos vuelven al pool sólo al final del tick
+    pool.release([a for a in agent_cells if not a.alive])
     agent_cells = [a for a in agent_cells if a.alive]
     agent_cells.extend(children)
 
     if len(agent_cells) > MAX_AGENTS:
-        agent_cells = sorted(agent_cells, key=lambda a: a.age)[:MAX_AGENTS]
-
-    # Dibujar
-    for x, y in bushes:
-        dx, dy = x*CELL_SIZE + offset_x, y*CELL_SIZE + offset_y
-        if -CELL_SIZE < dx < WIDTH and -CELL_SIZE < dy < HEIGHT:
-            pygame.draw.rect(screen, BUSH_COLOR, (dx, dy, CELL_SIZE, CELL_SIZE))
-    for x, y in lakes:
-        dx, dy = x*CELL_SIZE + offset_x, y*CELL_SIZE + offset_y
-        if -CELL_SIZE < dx < WIDTH and -CELL_SIZE < dy < HEIGHT:
-            pygame.draw.rect(screen, LAKE_COLOR, (dx, dy, CELL_SIZE, CELL_SIZE))
-
-    for agent in agent_cells:
-        color = STAGE_COLORS[agent.stage] if agent.alive else STAGE_COLORS['dead']
-        dx, dy = agent.x*CELL_SIZE + offset_x, agent.y*CELL_SIZE + offset_y
-        if -CELL_SIZE < dx < WIDTH and -CELL_SIZE < dy < HEIGHT:
-            pygame.draw.rect(screen, color, (dx, dy, CELL_SIZE, CELL_SIZE))
-
-    for x in range(0, WIDTH, CELL_SIZE):
-        pygame.draw.line(screen, GRID_COLOR, (x, 0), (x, HEIGHT))
-    for y in range(0, HEIGHT, CELL_SIZE):
-        pygame.draw.line(screen, GRID_COLOR, (0, y), (WIDTH, y))
+        agent_cells = sorted(agent_cells, key=lambda a: a.age)
+        for a in agent_cells[MAX_AGENTS:]:
+            a.alive = False   # fuera del mapa: su muerte programada ya no cuenta
+        pool.release(agent_cells[MAX_AGENTS:])
+        agent_cells = agent_cells[:MAX_AGENTS]
+    sim_time += TICK_MS
+
+def run_ticks():
+    """Ticks de este cuadro: K fijo, los que quepan en FRAME_BUDGET ('auto') o ~0.25 s ('off')."""
+    global tick_s
+    start = time.perf_counter()
+    if speed == 'auto':
+        k = max(1, int(FRAME_BUDGET / tick_s)) if tick_s else 1
+    else:
+        k = 1 if speed == 'off' else speed
+    done = 0
+    while done < k or (speed == 'off' and time.perf_counter() - start < 0.25):
+        step_simulation()
+        done += 1
+    per_tick = (time.perf_counter() - start) / done
+    tick_s = per_tick if tick_s is None else 0.8*tick_s + 0.2*per_tick
 
-    pygame.display.flip()
-
-pygame.quit()
\ No newline at end of file
+# Bucle principal
+def main():
+    global speed, offset_x, offset_y
+    running = True
+    while running:
+        clock.tick(FPS if speed != 'off' else 0)
+        screen.fill(BLACK)
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_w: offset_y += move_speed
+                if event.key == pygame.K_s: offset_y -= move_speed
+                if event.key == pygame.K_a: offset_x += move_speed
+                if event.key == pygame.K_d: offset_y -= move_speed
+                if event.key in SPEED_KEYS: speed = SPEED_KEYS[event.key]
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                mx, my = pygame.mouse.get_pos()
+                gx = int((mx - offset_x) / CELL_SIZE)
+                gy = int((my - offset_y) / CELL_SIZE)
+                if 0 <= gx < MAP_WIDTH and 0 <= gy < MAP_HEIGHT:
+                    agent_cells.append(pool.spawn(gx, gy, best_brain))
+
+        run_ticks()
+        if speed == 'off':
+            pygame.display.flip()
+            continue
+
+        # Dibujar
+        map_rgb[:] = BLACK
+        if bushes:
+            map_rgb[tuple(np.array(list(bushes)).T)] = BUSH_COLOR
+        if lakes:
+            map_rgb[tuple(np.array(list(lakes)).T)] = LAKE_COLOR
+        for agent in agent_cells:
+            map_rgb[agent.x, agent.y] = STAGE_COLORS[agent.stage] if agent.alive else STAGE_COLORS['dead']
+        pygame.surfarray.blit_array(map_surf, map_rgb)
+        blit_map()
+        screen.blit(grid_surf, (0, 0))
+
+        pygame.display.flip()
+
+    pygame.quit()
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,21 @@
-import pygame
+import argparse
+import cProfile
+import csv
+import heapq
+import itertools
+import json
+import multiprocessing as mp
+from multiprocessing import shared_memory
 import random
+import re
+import signal
+import sys
+import threading
+import time
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import os
+import pstats
 
 # --------------------
 # Configuración general
@@ -18,6 +32,14 @@ SCREEN_H = WORLD_H * WORLD_ROWS
 FPS = 30
 DT = 100
 
+# Ticks de simulación por cuadro dibujado (teclas 1, 2, 3, 4 y 0 en la ventana)
+SPEED_KEYS   = {'1': 1, '2': 10, '3': 100, '4': 'auto', '0': 'off'}
+FRAME_BUDGET = 0.8 / FPS   # segundos de simulación por cuadro en modo 'auto'
+
+# Instrumentación (tecla I: fases en el panel; tecla P: cProfile de unos ticks)
+PHASES   = ('regen', 'sense', 'inference', 'move', 'reproduction', 'cull', 'draw')
+COUNTERS = ('agents', 'births', 'deaths', 'resets', 'draws')
+
 BUSH_REGEN_TIME = 3000
 MIN_LIFESPAN    = 120_000
 MAX_LIFESPAN    = 240_000
@@ -27,20 +49,39 @@ MAX_AGENTS     = 1000
 BUSH_COUNT     = 150
 LAKE_COUNT     = 50
 
+# Red neuronal: visión (2R+1)x(2R+1) + hambre, sed, prev_obs (2), felicidad, miedo.
+# Cambiar el radio cambia OBS_SIZE: los best_brain.npz de otro radio no se cargan
+VISION_RADIUS = 2
+VISION_SIZE   = (2*VISION_RADIUS + 1) ** 2
+OBS_SIZE      = VISION_SIZE + 6
+HIDDEN_SIZE = 32
+NUM_ACTIONS = 6
+MOVES       = [(0,0),(0,-1),(0,1),(-1,0),(1,0),(0,0)]  # quieto, arriba, abajo, izq, der, ataque
+
+# REINFORCE
+GAMMA         = 0.99
+TRAJ_CAPACITY = 20_000   # pasos por mundo antes de volcar el gradiente (crece si hace falta)
+TRAJ_HORIZON  = int(np.ceil(np.log(0.01) / np.log(GAMMA)))   # pasos tras los que gamma^k < 1%
+
 BEST_BRAIN_FILE = 'best_brain.npz'
 STATS_FILE      = 'stats.npz'
+CHECKPOINT_DIR  = 'checkpoints'   # versiones anteriores de best_brain.npz (y de los cerebros de ES)
 
 # Estado global
 best_age           = 0
 best_brain         = None
 resets_count       = 0
 cumulative_time_ms = 0
+episode_log        = None   # en procesos de trabajo: episodios terminados para el padre
+checkpoints        = None   # CheckpointWriter activo, si lo hay
+profiler           = None   # PhaseProfiler activo, si lo hay (si no, no se mide nada)
 
 BLACK           = (0, 0, 0)
 PANEL_BG_COLOR  = (30, 30, 30)
 BUSH_COLOR      = (0, 200, 0)
 LAKE_COLOR      = (0, 100, 255)
 BOUNDARY_COLOR  = (80, 80, 80)
+STAGES          = ('child', 'adult', 'elder')
 STAGE_COLORS    = {'child': (255,255,255), 'adult': (255,0,0), 'elder': (150,150,150)}
 
 # Carga inicial de estadísticas
@@ -52,24 +93,76 @@ if os.path.exists(STATS_FILE):
 else:
     resets_count = cumulative_time_ms = best_age = 0
 
-def save_brain(brain):
-    np.savez(BEST_BRAIN_FILE, W1=brain.W1, W2=brain.W2)
+def atomic_savez(path, **arrays):
+    """np.savez a un temporal en el mismo directorio y rename: el fichero nunca queda a medias."""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def save_brain(brain, **meta):
+    atomic_savez(BEST_BRAIN_FILE, W1=brain.W1, W2=brain.W2, **meta)
+
+def record_best(world_id, age, brain):
+    global best_age, best_brain
+    best_age   = age
+    best_brain = brain.copy()
+    if checkpoints:
+        checkpoints.submit(best_brain, best_age=best_age, resets_count=resets_count)
+    else:
+        save_brain(best_brain, best_age=best_age, resets_count=resets_count, timestamp=time.time())
+    print(f"[World {world_id}] Nuevo récord global: {best_age} ms!")
 
 def load_brain():
     global best_brain, best_age
     if os.path.exists(BEST_BRAIN_FILE):
         data = np.load(BEST_BRAIN_FILE)
+        if data['W1'].shape != (OBS_SIZE, HIDDEN_SIZE):
+            print(f"{BEST_BRAIN_FILE} espera {data['W1'].shape[0]} entradas y OBS_SIZE es {OBS_SIZE} "
+                  f"(VISION_RADIUS = {VISION_RADIUS}); usando aleatorio.")
+            return None
         brain = SimpleBrain()
         brain.W1 = data['W1']
         brain.W2 = data['W2']
         best_brain = brain.copy()
-        print(f"Cerebro cargado: mejor récord previo = {best_age} ms")
+        if 'es_generation' in data.files:
+            # Lo escribió run_es: es un theta central, no el cerebro del récord
+            print(f"Cerebro cargado: central de ES (generación {int(data['es_generation'])}, "
+                  f"media {float(data['es_fitness']):.0f} ms); récord de supervivencia = {best_age} ms")
+        else:
+            print(f"Cerebro cargado: mejor récord previo = {best_age} ms")
         return brain
     print("No existe cerebro previo; usando aleatorio.")
     return None
 
+def policy_forward(W1, W2, X):
+    """
+    Paso hacia adelante en lote para las filas de X. Los pesos pueden ser
+    compartidos (2-D) o uno por fila, apilados en tensores 3-D.
+    """
+    if W1.ndim == 3:
+        h = np.tanh(X[:, None, :] @ W1)
+        return (h @ W2)[:, 0], h[:, 0]
+    h = np.tanh(X @ W1)
+    return h @ W2, h
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+def sample_actions(logits):
+    # Gumbel-max: argmax(logits + G) sigue la distribución softmax(logits)
+    gumbel = -np.log(-np.log(np.random.random(logits.shape)))
+    return np.argmax(logits + gumbel, axis=-1)
+
+def stage_codes(frac):
+    """Índice en STAGES para cada fracción edad/vida (mismos cortes que AgentCell.stage)."""
+    return (frac >= 0.25).astype(np.uint8) + (frac >= 0.75)
+
 class SimpleBrain:
-    def __init__(self, input_size=31, hidden_size=32, output_size=6, lr=1e-3):
+    def __init__(self, input_size=OBS_SIZE, hidden_size=HIDDEN_SIZE, output_size=NUM_ACTIONS, lr=1e-3):
         self.W1 = np.random.randn(input_size, hidden_size) * 0.1
         self.W2 = np.random.randn(hidden_size, output_size) * 0.1
         self.lr = lr
@@ -82,29 +175,61 @@ class SimpleBrain:
 
     def select_action(self, x):
         probs, h = self.forward(x)
-        a = np.random.choice(len(probs), p=probs)
+        # CDF inversa: bastante más barato que np.random.choice
+        a = min(int((probs.cumsum() < np.random.random()).sum()), len(probs)-1)
         logp = np.log(probs[a] + 1e-8)
         return a, logp, h
 
+    def select_actions(self, X):
+        """Versión en lote de select_action para filas que comparten este cerebro."""
+        logits, h = policy_forward(self.W1, self.W2, X)
+        a = sample_actions(logits)
+        logp = np.log(softmax(logits)[np.arange(len(a)), a] + 1e-8)
+        return a, logp, h
+
+    def policy_gradient(self, X, H, actions, adv):
+        """
+        Gradiente de -sum(adv * log pi(a|x)) respecto a W1 y W2. Reutiliza las
+        activaciones ocultas H guardadas al actuar, sin repetir la primera capa.
+        """
+        dlogits = softmax(H @ self.W2)
+        dlogits[np.arange(len(actions)), actions] -= 1
+        dlogits *= adv[:, None]
+        dH = (dlogits @ self.W2.T) * (1 - H**2)
+        return X.T @ dH, H.T @ dlogits
+
     def mutate(self, sigma=0.05):
         self.W1 += np.random.randn(*self.W1.shape) * sigma
         self.W2 += np.random.randn(*self.W2.shape) * sigma
 
-    def copy(self):
-        b = SimpleBrain()
-        b.W1, b.W2, b.lr = self.W1.copy(), self.W2.copy(), self.lr
+    @classmethod
+    def view(cls, W1, W2, lr=1e-3):
+        """Cerebro sobre pesos ya existentes (sin copiarlos ni sortear otros)."""
+        b = cls.__new__(cls)
+        b.W1, b.W2, b.lr = W1, W2, lr
         return b
 
+    def copy(self):
+        return SimpleBrain.view(self.W1.copy(), self.W2.copy(), self.lr)
+
+NO_PREV_OBS = np.zeros(2)   # prev_obs de un recién nacido (sólo se lee)
+
 class AgentCell:
-    def __init__(self, x, y, brain=None, world=None):
+    def __init__(self, x, y, brain=None, world=None, copy_brain=True):
+        self.brain = (brain.copy() if copy_brain else brain) if brain else SimpleBrain()
+        self.world = world
+        self.life = 0   # cuántas veces se ha usado este objeto (ver AgentPool)
+        self.respawn(x, y)
+
+    def respawn(self, x, y):
+        """Estado de un agente recién nacido en (x, y); el cerebro no se toca."""
         self.x, self.y = x, y
         self.hunger, self.thirst = 100.0, 100.0
         self.age = 0
         self.life_span = random.uniform(MIN_LIFESPAN, MAX_LIFESPAN)
-        self.brain = brain.copy() if brain else SimpleBrain()
         self.alive = True
-        self.world = world
-        self.prev_obs = np.zeros(2)
+        self.prev_obs = NO_PREV_OBS
+        self.life += 1
 
     @property
     def stage(self):
@@ -112,182 +237,1513 @@ class AgentCell:
         return 'child' if f<0.25 else 'adult' if f<0.75 else 'elder'
 
     def sense(self):
-        vision = []
-        R = 2
-        for dy in range(-R, R+1):
-            for dx in range(-R, R+1):
-                nx, ny = self.x+dx, self.y+dy
-                if 0<=nx<MAP_WIDTH and 0<=ny<MAP_HEIGHT:
-                    if (nx, ny) in self.world.bushes:   vision.append(1)
-                    elif (nx, ny) in self.world.lakes:  vision.append(2)
-                    else:
-                        occ = any(o.alive and o.x==nx and o.y==ny for o in self.world.agents)
-                        vision.append(3 if occ else 0)
-                else:
-                    vision.append(0)
-        base = [self.hunger/100, self.thirst/100]
+        # Ventana de las capas con borde del mundo: en coordenadas con borde el agente está en su centro
+        w = self.world
+        win = np.s_[self.y:self.y + 2*VISION_RADIUS + 1, self.x:self.x + 2*VISION_RADIUS + 1]
+        vision = cell_codes(w.bush_pad[win], w.lake_pad[win], w.occ_pad[win])
         happiness = (self.hunger + self.thirst)/200
-        fear = 1 - happiness
-        return np.array(vision + base + list(self.prev_obs) + [happiness, fear])
+        return np.concatenate([vision.ravel(), [self.hunger/100, self.thirst/100, *self.prev_obs, happiness, 1 - happiness]])
 
-    def move(self):
+    def move(self, prof=None):
+        # La muerte por edad la programa SmallWorld (ver schedule_death)
         if not self.alive: return
-        if self.age > self.life_span: 
-            return self.die()
 
         obs = self.sense()
+        if prof: prof.lap('sense')
         a, logp, h = self.brain.select_action(obs)
+        if prof: prof.lap('inference')
 
-        moves = [(0,0),(0,-1),(0,1),(-1,0),(1,0),(0,0)]
-        dx, dy = moves[a]
-        self.x = np.clip(self.x+dx, 0, MAP_WIDTH-1)
-        self.y = np.clip(self.y+dy, 0, MAP_HEIGHT-1)
+        dx, dy = MOVES[a]
+        x = min(max(self.x+dx, 0), MAP_WIDTH-1)
+        y = min(max(self.y+dy, 0), MAP_HEIGHT-1)
+        if x != self.x or y != self.y:
+            self.world.leave(self)
+            self.x, self.y = x, y
+            self.world.enter(self)
 
-        if (self.x, self.y) in self.world.bushes:
+        if self.world.bush_grid[self.y, self.x]:
             self.hunger = min(100, self.hunger+80)
-            self.world.bushes.remove((self.x, self.y))
-            self.world.bush_regen.append(((self.x, self.y), self.world.time_ms + BUSH_REGEN_TIME))
-        if (self.x, self.y) in self.world.lakes:
+            self.world.bush_grid[self.y, self.x] = False
+            heapq.heappush(self.world.bush_regen, (self.world.time_ms + BUSH_REGEN_TIME, self.x, self.y))
+        if self.world.lake_grid[self.y, self.x]:
             self.thirst = min(100, self.thirst+80)
 
         self.hunger -= 0.5
         self.thirst -= 0.5
         if self.hunger<=0 or self.thirst<=0:
-            return self.die()
+            self.die()
+            if prof: prof.lap('move')
+            return
 
-        if a==5 and self.stage in ('adult','elder'):
-            for o in self.world.agents:
-                if o is not self and o.alive and o.x==self.x and o.y==self.y:
-                    (o.die() if random.random()>0.5 else self.die())
-                    break
+        # La rejilla de ocupación descarta en O(1) el caso sin nadie más en la
+        # celda, y cell_agents da la víctima sin recorrer la población
+        if a==5 and self.stage in ('adult','elder') and self.world.occ[self.y, self.x] > 1:
+            o = next(o for o in self.world.cell_agents[self.x, self.y] if o is not self)
+            (o.die() if random.random()>0.5 else self.die())
+        if prof: prof.lap('move')
 
-        # Reproducción asexual simple (mutación local)
+        # Reproducción asexual simple (mutación local, aplicada al final del tick)
         if self.alive and self.stage=='adult' and self.hunger>70 and self.thirst>70:
-            child = AgentCell(self.x, self.y, brain=self.brain, world=self.world)
-            child.brain.mutate()
-            self.world.new_agents.append(child)
+            self.world.new_agents.append(self.world.pool.birth(self))
             self.hunger -= 30
             self.thirst -= 30
 
         self.prev_obs = obs[:2]
+        if prof: prof.lap('reproduction')
 
     def die(self):
         self.alive = False
-        if self.world and self.world.time_ms > self.world.local_best_age:
+        if not self.world:
+            return
+        self.world.leave(self)
+        if self.world.time_ms > self.world.local_best_age:
             self.world.local_best_age   = self.world.time_ms
-            self.world.local_best_brain = self.brain.copy()
+            self.world.keep_best(self.brain)
+
+def cell_codes(bush, lake, occ):
+    """Lo que ve un agente en cada celda: 1 arbusto, 2 lago, 3 otro agente, 0 nada (en ese orden)."""
+    return np.where(bush, 1, np.where(lake, 2, np.where(occ > 0, 3, 0)))
+
+def padded(dtype):
+    """Capa del mapa con un borde de VISION_RADIUS celdas vacías y su vista [y, x] sin borde."""
+    R = VISION_RADIUS
+    pad = np.zeros((MAP_HEIGHT + 2*R, MAP_WIDTH + 2*R), dtype=dtype)
+    return pad, pad[R:R + MAP_HEIGHT, R:R + MAP_WIDTH]
+
+class AgentPool:
+    """
+    AgentCell preasignados de un mundo. Los pesos de todos están apilados en
+    bloques y el cerebro de cada agente es una vista sobre su fila, así que
+    nacer no crea objetos ni arreglos: se copia el cerebro del padre en una
+    ranura libre. La mutación de todas las crías del tick se sortea de una vez
+    en mutate_births(). Si se agotan las ranuras se añade otro bloque sin
+    mover los anteriores.
+    """
+    def __init__(self, world, block=64):
+        self.world = world
+        self.block = block
+        self.agents = []   # todos, vivos o no
+        self.free = []
+        self.births = []
+
+    def _grow(self):
+        W1 = np.empty((self.block, OBS_SIZE, HIDDEN_SIZE))
+        W2 = np.empty((self.block, HIDDEN_SIZE, NUM_ACTIONS))
+        new = [AgentCell(0, 0, SimpleBrain.view(W1[i], W2[i]), self.world, copy_brain=False)
+               for i in range(self.block)]
+        for ag in new:
+            ag.alive = False
+        self.agents += new
+        self.free += reversed(new)
+
+    def spawn(self, x, y, brain=None):
+        """Agente vivo en (x, y) con una copia de brain (o pesos aleatorios)."""
+        if not self.free:
+            self._grow()
+        ag = self.free.pop()
+        ag.respawn(x, y)
+        if brain is None:
+            ag.brain.W1[:] = np.random.randn(OBS_SIZE, HIDDEN_SIZE) * 0.1
+            ag.brain.W2[:] = np.random.randn(HIDDEN_SIZE, NUM_ACTIONS) * 0.1
+        else:
+            np.copyto(ag.brain.W1, brain.W1)
+            np.copyto(ag.brain.W2, brain.W2)
+        return ag
+
+    def birth(self, parent):
+        child = self.spawn(parent.x, parent.y, parent.brain)
+        self.births.append(child)
+        return child
+
+    def mutate_births(self, sigma=0.05):
+        k = len(self.births)
+        if not k:
+            return
+        noise1 = np.random.randn(k, OBS_SIZE, HIDDEN_SIZE)
+        noise2 = np.random.randn(k, HIDDEN_SIZE, NUM_ACTIONS)
+        noise1 *= sigma
+        noise2 *= sigma
+        for ag, d1, d2 in zip(self.births, noise1, noise2):
+            ag.brain.W1 += d1
+            ag.brain.W2 += d2
+        self.births.clear()
+
+    def release(self, agents):
+        # Sólo al final del tick: un muerto sigue en world.agents hasta entonces
+        self.free += agents
+
+    def clear(self):
+        for ag in self.agents:
+            ag.alive = False
+        self.free = self.agents[::-1]
+        self.births.clear()
 
 class SmallWorld:
-    def __init__(self, world_id):
+    save_records = True   # si False, handle_reset no toca el récord global (ver VecEnv)
+
+    def __init__(self, world_id, initial_agents=INITIAL_AGENTS):
         self.id = world_id
+        self.initial_agents = initial_agents
+        self.pool = AgentPool(self)
+        # Destino de local_best_brain: se sobrescribe en cada muerte récord en vez de copiar el cerebro
+        self.best_buf = SimpleBrain.view(np.empty((OBS_SIZE, HIDDEN_SIZE)), np.empty((HIDDEN_SIZE, NUM_ACTIONS)))
         self.reset()
 
     def reset(self):
         global best_brain, best_age, resets_count
-        b = best_brain.copy() if best_brain else None
-        self.bushes = {(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT)) for _ in range(BUSH_COUNT)}
-        self.lakes  = {(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT)) for _ in range(LAKE_COUNT)}
-        self.bush_regen = []
-        self.agents = [AgentCell(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT), brain=b, world=self)
-                       for _ in range(INITIAL_AGENTS)]
+        b = best_brain   # spawn() y keep_best() copian sus pesos
+        self.place_resources()
+        self.bush_regen = []   # montículo de (tiempo, x, y)
+        self.deaths = []       # montículo de (tiempo, orden, agente, vida del agente)
+        self.death_order = itertools.count()
+        self.pool.clear()
+        self.agents = [self.pool.spawn(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT), b)
+                       for _ in range(self.initial_agents)]
+        for ag in self.agents:
+            self.schedule_death(ag, 0)
+        # Agentes vivos por celda (conteo y, por orden de llegada, quiénes),
+        # actualizados al moverse, nacer y morir con enter() y leave()
+        self.occ_pad, self.occ = padded(np.int32)
+        self.cell_agents = {}   # (x, y) -> {agente: None}
+        for ag in self.agents:
+            self.enter(ag)
         self.time_ms = 0
         self.local_best_age = 0
-        self.local_best_brain = b.copy() if b else None
+        self.local_best_brain = None
+        if b:
+            self.keep_best(b)
         self.new_agents = []
         resets_count += 1
         print(f"[World {self.id}] Reiniciado: {len(self.agents)} agentes (Total resets: {resets_count})")
 
+    def enter(self, ag):
+        self.occ[ag.y, ag.x] += 1
+        self.cell_agents.setdefault((ag.x, ag.y), {})[ag] = None
+
+    def leave(self, ag):
+        self.occ[ag.y, ag.x] -= 1
+        cell = self.cell_agents[ag.x, ag.y]
+        del cell[ag]
+        if not cell:
+            del self.cell_agents[ag.x, ag.y]
+
+    def place_resources(self):
+        bushes = {(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT)) for _ in range(BUSH_COUNT)}
+        lakes  = {(random.randrange(MAP_WIDTH), random.randrange(MAP_HEIGHT)) for _ in range(LAKE_COUNT)}
+        # Capas del mapa indexadas [y, x]; son vistas sobre capas con borde para la visión
+        self.bush_pad, self.bush_grid = padded(bool)
+        self.lake_pad, self.lake_grid = padded(bool)
+        for x, y in bushes: self.bush_grid[y, x] = True
+        for x, y in lakes:  self.lake_grid[y, x] = True
+
+    @property
+    def bushes(self):
+        return {(int(x), int(y)) for y, x in np.argwhere(self.bush_grid)}
+
+    @property
+    def lakes(self):
+        return {(int(x), int(y)) for y, x in np.argwhere(self.lake_grid)}
+
+    def schedule_death(self, ag, first_move_ms):
+        # Muere en el primer tick en que age > life_span; age suma DT por tick desde 0
+        t = first_move_ms + (int(ag.life_span // DT) + 1) * DT
+        heapq.heappush(self.deaths, (t, next(self.death_order), ag, ag.life))
+
     def update(self):
-        for pos, t in list(self.bush_regen):
-            if self.time_ms >= t:
-                self.bushes.add(pos)
-                self.bush_regen.remove((pos, t))
+        prof = profiler
+        if prof: prof.start(self.id)
+        # Sólo se tocan las entradas que vencen en este tick
+        while self.bush_regen and self.bush_regen[0][0] <= self.time_ms:
+            _, x, y = heapq.heappop(self.bush_regen)
+            self.bush_grid[y, x] = True
+        if prof: prof.lap('regen')
+        while self.deaths and self.deaths[0][0] <= self.time_ms:
+            _, _, ag, life = heapq.heappop(self.deaths)
+            if ag.alive and ag.life == life:   # el objeto pudo reutilizarse para otro agente
+                ag.die()
+        if prof: prof.lap('cull')
         self.new_agents = []
         for ag in self.agents:
-            ag.move()
+            ag.move(prof)
             ag.age += DT
+        self.pool.mutate_births()
+        if prof: prof.lap('reproduction')
+        dead = [a for a in self.agents if not a.alive]
+        if prof: prof.count(agents=len(self.agents), births=len(self.new_agents), deaths=len(dead))
+        self.pool.release(dead)
         self.agents = [a for a in self.agents if a.alive] + self.new_agents
+        for ag in self.new_agents:
+            self.enter(ag)
+            self.schedule_death(ag, self.time_ms + DT)
         if len(self.agents) > MAX_AGENTS:
-            self.agents = sorted(self.agents, key=lambda a: a.age)[:MAX_AGENTS]
+            self.agents = sorted(self.agents, key=lambda a: a.age)
+            for ag in self.agents[MAX_AGENTS:]:
+                self.leave(ag)
+                ag.alive = False   # fuera del mundo: su muerte programada ya no cuenta
+            self.pool.release(self.agents[MAX_AGENTS:])
+            self.agents = self.agents[:MAX_AGENTS]
         self.time_ms += DT
+        if prof: prof.lap('cull')
         if not self.agents:
             print(f"[World {self.id}] murieron todos en {self.time_ms} ms")
             self.handle_reset()
 
+    def keep_best(self, brain):
+        np.copyto(self.best_buf.W1, brain.W1)
+        np.copyto(self.best_buf.W2, brain.W2)
+        self.local_best_brain = self.best_buf
+
     def handle_reset(self):
-        global best_age, best_brain
+        if profiler: profiler.count(resets=1)
         # Sólo aquí actualizo el récord global y guardo el cerebro
-        if self.local_best_age > best_age:
-            best_age   = self.local_best_age
-            best_brain = self.local_best_brain.copy()
-            save_brain(best_brain)
-            print(f"[World {self.id}] Nuevo récord global: {best_age} ms!")
+        if episode_log is not None:
+            # Proceso de trabajo: el padre decide el récord y guarda
+            # Copia: el búfer del mundo se reutiliza antes de que el episodio llegue al padre
+            b = self.local_best_brain
+            episode_log.append((self.id, self.local_best_age, b.copy() if b else None))
+        elif self.save_records and self.local_best_age > best_age:
+            record_best(self.id, self.local_best_age, self.local_best_brain)
         self.reset()
 
+    def agent_arrays(self):
+        """Posiciones y etapa (índice en STAGES) de los agentes, como arreglos."""
+        n = len(self.agents)
+        x = np.fromiter((a.x for a in self.agents), np.int64, n)
+        y = np.fromiter((a.y for a in self.agents), np.int64, n)
+        frac = np.fromiter((a.age / a.life_span for a in self.agents), np.float64, n)
+        return x, y, stage_codes(frac)
+
+class ArrayWorld(SmallWorld):
+    """
+    Mismo mundo que SmallWorld, pero con el estado de los agentes en arreglos
+    NumPy contiguos (uno por atributo) y un único paso vectorizado por tick.
+    Todos los agentes perciben el mundo al inicio del tick.
+
+    Con `brain` todos los agentes comparten ese SimpleBrain (p. ej. el que
+    entrena ReinforceTrainer) en lugar de llevar cada uno su copia mutada.
+    """
+    def __init__(self, world_id, initial_agents=INITIAL_AGENTS, brain=None):
+        self.brain = brain
+        self.fields = ('ids', 'x', 'y', 'hunger', 'thirst', 'age', 'life_span', 'alive', 'prev_obs')
+        if brain is None:
+            self.fields += ('W1', 'W2')
+        self.next_id = 0
+        super().__init__(world_id, initial_agents)
+
+    def reset(self):
+        global resets_count
+        b = best_brain.copy() if best_brain and self.brain is None else None
+        self.place_resources()
+        self.bush_regen = []   # montículo de (tiempo, x, y)
+
+        n = self.initial_agents
+        self.ids       = self.new_ids(n)
+        self.x         = np.array([random.randrange(MAP_WIDTH) for _ in range(n)], dtype=np.int64)
+        self.y         = np.array([random.randrange(MAP_HEIGHT) for _ in range(n)], dtype=np.int64)
+        self.hunger    = np.full(n, 100.0)
+        self.thirst    = np.full(n, 100.0)
+        self.age       = np.zeros(n, dtype=np.int64)
+        self.life_span = np.array([random.uniform(MIN_LIFESPAN, MAX_LIFESPAN) for _ in range(n)])
+        self.alive     = np.ones(n, dtype=bool)
+        self.prev_obs  = np.zeros((n, 2))
+        if self.brain is None and b:
+            self.W1 = np.repeat(b.W1[None], n, axis=0)
+            self.W2 = np.repeat(b.W2[None], n, axis=0)
+        elif self.brain is None:
+            self.W1 = np.random.randn(n, OBS_SIZE, HIDDEN_SIZE) * 0.1
+            self.W2 = np.random.randn(n, HIDDEN_SIZE, NUM_ACTIONS) * 0.1
+
+        self.time_ms = 0
+        self.local_best_age = 0
+        self.local_best_brain = b.copy() if b else None
+        resets_count += 1
+        print(f"[World {self.id}] Reiniciado: {n} agentes (Total resets: {resets_count})")
+
+    @property
+    def n(self):
+        return len(self.x)
+
+    def new_ids(self, k):
+        # Identificadores estables entre ticks (los índices cambian al compactar)
+        self.next_id += k
+        return np.arange(self.next_id - k, self.next_id)
+
+    def _stage_frac(self):
+        return self.age / self.life_span
+
+    def sense(self, idx):
+        # Códigos del mapa (ver cell_codes) en una capa con borde, y la ventana de
+        # cada agente sacada de una vez: vista (alto, ancho, 2R+1, 2R+1) indexada [y, x]
+        code_pad, code = padded(np.int8)
+        occ = np.zeros((MAP_HEIGHT, MAP_WIDTH), dtype=bool)
+        occ[self.y[idx], self.x[idx]] = True
+        code[:] = cell_codes(self.bush_grid, self.lake_grid, occ)
+        k = 2*VISION_RADIUS + 1
+        vision = sliding_window_view(code_pad, (k, k))[self.y[idx], self.x[idx]].reshape(len(idx), VISION_SIZE)
+
+        hunger, thirst = self.hunger[idx], self.thirst[idx]
+        happiness = (hunger + thirst) / 200
+        return np.column_stack([vision, hunger/100, thirst/100, self.prev_obs[idx], happiness, 1 - happiness])
+
+    def logits(self, obs):
+        if self.brain is not None:
+            return policy_forward(self.brain.W1, self.brain.W2, obs)[0]
+        idx = self._idx
+        # Sin copiar los pesos apilados en el caso habitual (nadie murió de viejo)
+        if len(idx) == self.n:
+            return policy_forward(self.W1, self.W2, obs)[0]
+        return policy_forward(self.W1[idx], self.W2[idx], obs)[0]
+
+    def kill(self, idx):
+        self.alive[idx] = False
+
+    def update(self):
+        obs = self.observe()
+        a = sample_actions(self.logits(obs))
+        if profiler: profiler.lap('inference')
+        self.apply(obs, a)
+
+    def observe(self):
+        """Primera mitad del tick: regeneración, muerte por edad y percepción."""
+        prof = profiler
+        if prof: prof.start(self.id)
+        while self.bush_regen and self.bush_regen[0][0] <= self.time_ms:
+            _, x, y = heapq.heappop(self.bush_regen)
+            self.bush_grid[y, x] = True
+        if prof: prof.lap('regen')
+
+        self._frac = self._stage_frac()
+        self.kill(self.age > self.life_span)
+        self._idx = np.flatnonzero(self.alive)
+        if prof: prof.lap('cull')
+        obs = self.sense(self._idx)
+        if prof: prof.lap('sense')
+        return obs
+
+    def apply(self, obs, a):
+        """Segunda mitad del tick: mueve a los agentes de observe() según las acciones a."""
+        prof = profiler
+        if prof: prof.start(self.id)
+        idx, frac = self._idx, self._frac
+        moves = np.array(MOVES)
+        self.x[idx] = np.clip(self.x[idx] + moves[a, 0], 0, MAP_WIDTH-1)
+        self.y[idx] = np.clip(self.y[idx] + moves[a, 1], 0, MAP_HEIGHT-1)
+        x, y = self.x[idx], self.y[idx]
+
+        # Sólo el primero (en orden) que pisa un arbusto se lo come
+        on_bush = np.flatnonzero(self.bush_grid[y, x])
+        cells = y[on_bush] * MAP_WIDTH + x[on_bush]
+        _, first = np.unique(cells, return_index=True)
+        eaters = idx[on_bush[first]]
+        self.hunger[eaters] = np.minimum(100, self.hunger[eaters] + 80)
+        self.bush_grid[self.y[eaters], self.x[eaters]] = False
+        for ex, ey in zip(self.x[eaters].tolist(), self.y[eaters].tolist()):
+            heapq.heappush(self.bush_regen, (self.time_ms + BUSH_REGEN_TIME, ex, ey))
+
+        drinkers = idx[self.lake_grid[y, x]]
+        self.thirst[drinkers] = np.minimum(100, self.thirst[drinkers] + 80)
+
+        self.hunger[idx] -= 0.5
+        self.thirst[idx] -= 0.5
+        self.kill(idx[(self.hunger[idx] <= 0) | (self.thirst[idx] <= 0)])
+
+        # Ataques: sólo se resuelven uno a uno los atacantes que comparten celda
+        cells = self.y * MAP_WIDTH + self.x
+        counts = np.bincount(cells[self.alive], minlength=MAP_WIDTH * MAP_HEIGHT)
+        attackers = idx[(a == 5) & (frac[idx] >= 0.25) & self.alive[idx] & (counts[cells[idx]] > 1)]
+        for i in attackers:
+            if not self.alive[i]:
+                continue
+            others = np.flatnonzero(self.alive & (cells == cells[i]))
+            others = others[others != i]
+            if len(others):
+                self.kill(others[0] if random.random() > 0.5 else i)
+        if prof: prof.lap('move')
+
+        # Reproducción asexual simple (mutación local)
+        parents = idx[self.alive[idx] & (frac[idx] >= 0.25) & (frac[idx] < 0.75)
+                      & (self.hunger[idx] > 70) & (self.thirst[idx] > 70)]
+        self.hunger[parents] -= 30
+        self.thirst[parents] -= 30
+
+        survivors = idx[self.alive[idx]]
+        self.prev_obs[survivors] = obs[self.alive[idx], :2]
+        self.age += DT
+
+        dead = np.flatnonzero(~self.alive)
+        if len(dead) and self.time_ms > self.local_best_age:
+            self.local_best_age = self.time_ms
+            self.local_best_brain = self.brain_at(dead[0])
+        if prof:
+            prof.count(agents=len(idx), births=len(parents), deaths=len(dead))
+            prof.lap('reproduction')
+
+        self._compact(np.flatnonzero(self.alive), parents)
+        self.time_ms += DT
+        if prof: prof.lap('cull')
+        if self.n == 0:
+            print(f"[World {self.id}] murieron todos en {self.time_ms} ms")
+            self.handle_reset()
+
+    def _compact(self, keep, parents):
+        k = len(parents)
+        fields = self.fields
+        if k == 0 and len(keep) == self.n:
+            return
+        if k:
+            children = {
+                'ids': self.new_ids(k), 'x': self.x[parents], 'y': self.y[parents],
+                'hunger': np.full(k, 100.0), 'thirst': np.full(k, 100.0),
+                'age': np.zeros(k, dtype=np.int64),
+                'life_span': np.array([random.uniform(MIN_LIFESPAN, MAX_LIFESPAN) for _ in range(k)]),
+                'alive': np.ones(k, dtype=bool), 'prev_obs': np.zeros((k, 2)),
+            }
+            if self.brain is None:
+                children['W1'] = self.W1[parents] + np.random.randn(k, OBS_SIZE, HIDDEN_SIZE) * 0.05
+                children['W2'] = self.W2[parents] + np.random.randn(k, HIDDEN_SIZE, NUM_ACTIONS) * 0.05
+            for f in fields:
+                setattr(self, f, np.concatenate([getattr(self, f)[keep], children[f]]))
+        else:
+            for f in fields:
+                setattr(self, f, getattr(self, f)[keep])
+        if self.n > MAX_AGENTS:
+            order = np.argsort(self.age, kind='stable')[:MAX_AGENTS]
+            for f in fields:
+                setattr(self, f, getattr(self, f)[order])
+
+    def brain_at(self, i):
+        if self.brain is not None:
+            return self.brain.copy()
+        b = SimpleBrain()
+        b.W1, b.W2 = self.W1[i].copy(), self.W2[i].copy()
+        return b
+
+    def agent_arrays(self):
+        return self.x, self.y, stage_codes(self._stage_frac())
+
+WORLD_ENGINES = {'objects': SmallWorld, 'arrays': ArrayWorld}
+
+def step_worlds(worlds):
+    """
+    Avanza un tick todos los mundos. Los ArrayWorld se perciben primero y
+    sus acciones se muestrean juntas en una sola operación.
+    """
+    batched = [w for w in worlds if isinstance(w, ArrayWorld)]
+    for w in worlds:
+        if not isinstance(w, ArrayWorld):
+            w.update()
+    if not batched:
+        return
+    obs = [w.observe() for w in batched]
+    if profiler: profiler.start(None)
+    logits = np.concatenate([w.logits(o) for w, o in zip(batched, obs)])
+    actions = np.split(sample_actions(logits), np.cumsum([len(o) for o in obs])[:-1])
+    if profiler: profiler.lap('inference')
+    for w, o, a in zip(batched, obs, actions):
+        w.apply(o, a)
+
+class VecEnv:
+    """
+    Interfaz vectorizada al estilo de Gym sobre n_worlds ArrayWorld, para
+    aprendices externos. Cada fila es un agente vivo de algún mundo: reset()
+    y step() devuelven las observaciones apiladas (N, OBS_SIZE), con el mismo
+    formato que AgentCell.sense, y sus ids (N, 2) = (mundo, agente).
+
+    step(actions) recibe una acción por fila de la última observación y
+    devuelve, alineadas con esas filas, la recompensa (1 si el agente sigue
+    vivo en la nueva observación, como en REINFORCE) y la máscara done; y
+    además la nueva observación con sus ids, que ya incluyen a los recién
+    nacidos. Un mundo sin agentes se reinicia solo (handle_reset) y su índice
+    queda en `resets`.
+
+    Con `brain` (p. ej. el SimpleBrain que entrena el aprendiz) los mundos lo
+    guardan como récord igual que en el entrenamiento; sin él no guardan nada.
+    """
+    def __init__(self, n_worlds=NUM_WORLDS, initial_agents=INITIAL_AGENTS, brain=None):
+        # Con un cerebro compartido ArrayWorld no guarda ni muta pesos por agente
+        self.worlds = [ArrayWorld(i, initial_agents, brain=brain or SimpleBrain()) for i in range(n_worlds)]
+        for w in self.worlds:
+            w.save_records = brain is not None
+        self.resets = []
+        self._obs = None
+
+    @property
+    def num_envs(self):
+        return len(self.worlds)
+
+    def reset(self):
+        for w in self.worlds:
+            w.reset()
+        return self._observe()
+
+    def _observe(self):
+        self._obs = [w.observe() for w in self.worlds]
+        self._ids = [w.ids[w._idx] for w in self.worlds]
+        ids = np.concatenate([np.column_stack([np.full(len(i), w.id), i]) for w, i in zip(self.worlds, self._ids)])
+        return np.concatenate(self._obs), ids
+
+    def step(self, actions):
+        """Avanza un tick todos los mundos. Devuelve (obs, rewards, dones, ids)."""
+        if self._obs is None:
+            raise RuntimeError("VecEnv.step() antes de reset()")
+        actions = np.asarray(actions)
+        counts = [len(o) for o in self._obs]
+        if actions.shape != (sum(counts),):
+            raise ValueError(f"se esperaban {sum(counts)} acciones, una por fila de la observación; llegaron {actions.shape}")
+        acted = self._ids
+        self.resets = []
+        for w, o, a in zip(self.worlds, self._obs, np.split(actions, np.cumsum(counts)[:-1])):
+            w.apply(o, a)
+            if w.time_ms == 0:  # handle_reset: murieron todos
+                self.resets.append(w.id)
+        obs, ids = self._observe()
+        # Los ids no se reutilizan (tampoco al reiniciar), así que basta ver quién sigue
+        dones = np.concatenate([~np.isin(before, now) for before, now in zip(acted, self._ids)])
+        return obs, (~dones).astype(np.float64), dones, ids
+
+class SharedWorldState:
+    """
+    Capas del mapa y posición/etapa de los agentes de un mundo en un bloque de
+    multiprocessing.shared_memory, para que otro proceso lo lea sin copias.
+    Lo protege un seqlock: el escritor deja la secuencia impar mientras
+    escribe, y el lector repite si la ve impar o si cambió durante su lectura.
+
+    No es el estado vivo del mundo: el mundo sigue con sus propias capas y
+    publish() copia en el bloque las dos capas y agent_arrays() (que en el
+    motor 'objects' recorre los agentes). Por eso los trabajadores publican
+    como mucho FPS veces por segundo, no en cada tick. Si tras `tries`
+    intentos read() no logra una lectura consistente, devuelve la última
+    (quizá mezclada) y la cuenta en torn_reads.
+    """
+    CELLS = MAP_WIDTH * MAP_HEIGHT
+
+    def __init__(self, name=None):
+        size = 3*8 + 2*self.CELLS + MAX_AGENTS*(2+2+1)
+        # Los trabajadores comparten el resource_tracker del padre, que es
+        # quien crea y libera (unlink) el bloque
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        buf, off = self.shm.buf, 0
+        self.header = np.ndarray(3, np.int64, buf, off); off += 3*8  # secuencia, agentes, time_ms
+        self.bush_grid = np.ndarray((MAP_HEIGHT, MAP_WIDTH), bool, buf, off); off += self.CELLS
+        self.lake_grid = np.ndarray((MAP_HEIGHT, MAP_WIDTH), bool, buf, off); off += self.CELLS
+        self.x = np.ndarray(MAX_AGENTS, np.int16, buf, off); off += 2*MAX_AGENTS
+        self.y = np.ndarray(MAX_AGENTS, np.int16, buf, off); off += 2*MAX_AGENTS
+        self.stage = np.ndarray(MAX_AGENTS, np.uint8, buf, off)
+        self.torn_reads = 0   # lecturas que se dieron por buenas sin ser consistentes
+        if name is None:
+            self.header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def time_ms(self):
+        return int(self.header[2])
+
+    def publish(self, world):
+        seq = self.header[0]
+        self.header[0] = seq + 1
+        self.bush_grid[:] = world.bush_grid
+        self.lake_grid[:] = world.lake_grid
+        x, y, stage = world.agent_arrays()
+        n = min(len(x), MAX_AGENTS)
+        self.x[:n], self.y[:n], self.stage[:n] = x[:n], y[:n], stage[:n]
+        self.header[1] = n
+        self.header[2] = world.time_ms
+        self.header[0] = seq + 2
+
+    def agent_arrays(self):
+        n = self.header[1]
+        return self.x[:n], self.y[:n], self.stage[:n]
+
+    def read(self, fn, tries=100):
+        """Ejecuta fn(self) sobre los datos compartidos hasta que la lectura sea consistente."""
+        for _ in range(tries):
+            seq = self.header[0]
+            if not seq % 2:
+                out = fn(self)
+                if self.header[0] == seq:
+                    return out
+            time.sleep(0)   # ceder la CPU al escritor, que está a mitad de publish()
+        self.torn_reads += 1
+        if self.torn_reads == 1:
+            print(f"[SharedWorldState] {self.name}: lectura posiblemente mezclada tras {tries} intentos")
+        return fn(self)
+
+    def close(self, unlink=False):
+        # Soltar las vistas antes de cerrar el bloque
+        del self.header, self.bush_grid, self.lake_grid, self.x, self.y, self.stage
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+def _worlds_worker(conn, world_ids, engine, initial_agents, best, seed, shm_names=None):
+    """
+    Bucle de un proceso de trabajo. Con 'step' avanza sus mundos los ticks
+    pedidos y responde; con 'run' avanza sin pausa, publica su estado en
+    memoria compartida (como mucho FPS veces por segundo: es una copia) y
+    envía los episodios terminados según ocurren.
+    """
+    global best_age, best_brain, episode_log
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # el padre gestiona Ctrl+C
+    random.seed(seed)
+    np.random.seed(seed)
+    episode_log = []
+    _set_best(best)
+    worlds = [WORLD_ENGINES[engine](i, initial_agents) for i in world_ids]
+    states = [SharedWorldState(name) for name in shm_names] if shm_names else []
+    next_publish = 0.0
+
+    def tick():
+        nonlocal next_publish
+        step_worlds(worlds)
+        # La ventana no dibuja más de FPS cuadros por segundo: publicar más es copiar de balde
+        if states and time.monotonic() >= next_publish:
+            next_publish = time.monotonic() + 1 / FPS
+            for st, w in zip(states, worlds):
+                st.publish(w)
+
+    def report():
+        conn.send([(wid, age, (b.W1, b.W2) if b else None) for wid, age, b in episode_log])
+        episode_log.clear()
+
+    running = False
+    while True:
+        if not running or conn.poll():
+            cmd, ticks, best = conn.recv()
+            if cmd == 'stop':
+                break
+            _set_best(best)
+            if cmd == 'run':
+                running = True
+            elif cmd == 'step':
+                for _ in range(ticks):
+                    tick()
+                report()
+            continue
+        tick()
+        if episode_log:
+            report()
+    for st in states:
+        st.close()
+    conn.close()
+
+def _set_best(best):
+    global best_age, best_brain
+    if best is None:
+        return
+    best_age, (W1, W2) = best
+    best_brain = SimpleBrain()
+    best_brain.W1, best_brain.W2 = W1, W2
+
+class ParallelWorlds:
+    """
+    Reparte los mundos entre n_workers procesos que los avanzan en paralelo,
+    ticks_per_sync ticks por llamada a step(). Los trabajadores devuelven los
+    episodios terminados (mundo, local_best_age, local_best_brain); el padre
+    es el único que actualiza best_brain/best_age y guarda, y reenvía el
+    nuevo mejor cerebro para los siguientes reinicios.
+    """
+    def __init__(self, n_workers, n_worlds=NUM_WORLDS, engine='objects',
+                 initial_agents=INITIAL_AGENTS, ticks_per_sync=10, seed=None, shared=False):
+        global resets_count
+        self.ticks_per_sync = ticks_per_sync
+        self.sent_best_age = None
+        self.conns, self.procs = [], []
+        # Con shared=True cada mundo publica su estado en states[id] (ver SharedWorldState)
+        self.states = [SharedWorldState() for _ in range(n_worlds)] if shared else []
+        seeds = np.random.SeedSequence(seed).generate_state(n_workers)
+        best = self._best_update()
+        for k in range(n_workers):
+            ids = list(range(k, n_worlds, n_workers))
+            names = [self.states[i].name for i in ids] if shared else None
+            parent, child = mp.Pipe()
+            p = mp.Process(target=_worlds_worker, daemon=True,
+                           args=(child, ids, engine, initial_agents, best, int(seeds[k]), names))
+            p.start()
+            self.conns.append(parent)
+            self.procs.append(p)
+        resets_count += n_worlds
+
+    def _best_update(self):
+        if best_brain is None or best_age == self.sent_best_age:
+            return None
+        self.sent_best_age = best_age
+        return best_age, (best_brain.W1, best_brain.W2)
+
+    def step(self):
+        best = self._best_update()
+        for conn in self.conns:
+            conn.send(('step', self.ticks_per_sync, best))
+        for conn in self.conns:
+            self._merge(conn.recv())
+
+    def run(self):
+        """Deja a los trabajadores avanzando sin pausa; poll() recoge sus resultados."""
+        best = self._best_update()
+        for conn in self.conns:
+            conn.send(('run', 0, best))
+
+    def poll(self):
+        for conn in self.conns:
+            while conn.poll():
+                self._merge(conn.recv())
+        best = self._best_update()
+        if best is not None:
+            for conn in self.conns:
+                conn.send(('best', 0, best))
+
+    def _merge(self, episodes):
+        global resets_count
+        for wid, age, brain in episodes:
+            resets_count += 1
+            if age > best_age:
+                b = SimpleBrain()
+                b.W1, b.W2 = brain
+                record_best(wid, age, b)
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(('stop', 0, None))
+        for conn, p in zip(self.conns, self.procs):
+            # Vaciar la tubería para que ningún trabajador quede bloqueado enviando
+            try:
+                while p.is_alive():
+                    if conn.poll(0.05):
+                        self._merge(conn.recv())
+            except EOFError:
+                pass
+            p.join()
+        for st in self.states:
+            st.close(unlink=True)
+
+class TrajectoryBuffer:
+    """Pasos (obs, h, acción) de un mundo, en arreglos reservados de antemano."""
+    def __init__(self, capacity=TRAJ_CAPACITY):
+        self.obs    = np.empty((capacity, OBS_SIZE), dtype=np.float32)
+        self.h      = np.empty((capacity, HIDDEN_SIZE), dtype=np.float32)
+        self.action = np.empty(capacity, dtype=np.int64)
+        self.agent  = np.empty(capacity, dtype=np.int64)
+        self.step   = np.empty(capacity, dtype=np.int64)
+        self.size   = 0
+
+    def free(self):
+        return len(self.action) - self.size
+
+    def record(self, obs, h, action, agent, step):
+        s = slice(self.size, self.size + len(action))
+        self.obs[s], self.h[s], self.action[s], self.agent[s], self.step[s] = obs, h, action, agent, step
+        self.size = s.stop
+
+    def returns(self, gamma=GAMMA, open_ids=None, now=0):
+        # Recompensa 1 por tick sobrevivido: G_t = (1 - gamma^k) / (1 - gamma),
+        # con k los pasos que el agente siguió registrado después de t. Los de
+        # open_ids siguen vivos en el paso `now`, así que para ellos k es sólo
+        # una cota inferior
+        agent, step = self.agent[:self.size], self.step[:self.size]
+        _, inv = np.unique(agent, return_inverse=True)
+        last = np.full(inv.max() + 1, -1)
+        np.maximum.at(last, inv, step)
+        last = last[inv]
+        if open_ids is not None:
+            last = np.where(np.isin(agent, open_ids), now, last)
+        return (1 - gamma ** (last - step)) / (1 - gamma)
+
+    def keep(self, rows):
+        """Deja sólo las filas marcadas en rows, al principio del buffer."""
+        k = int(rows.sum())
+        for a in (self.obs, self.h, self.action, self.agent, self.step):
+            a[:k] = a[:self.size][rows]
+        self.size = k
+
+    def reserve(self, n):
+        """Amplía el buffer (al menos al doble) si no caben n pasos más."""
+        if self.free() >= n:
+            return
+        capacity = max(2 * len(self.action), self.size + n)
+        for name in ('obs', 'h', 'action', 'agent', 'step'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+class ReinforceTrainer:
+    """
+    REINFORCE sobre un SimpleBrain compartido por los agentes de todos los
+    mundos (ArrayWorld con brain=trainer.brain). Cada mundo llena su
+    TrajectoryBuffer; al acabar un episodio su gradiente se acumula, y cada
+    `batch_episodes` episodios se aplica una sola actualización con brain.lr.
+
+    Si un buffer se llena a mitad de episodio sólo se vuelcan los pasos cuyo
+    retorno ya se conoce: los de agentes muertos, y los de agentes vivos con
+    más de TRAJ_HORIZON pasos de antigüedad (lo que falta por sumar es < 1%).
+    El resto pasa al siguiente volcado; si aun así no cabe, el buffer crece.
+    """
+    def __init__(self, brain, n_worlds, batch_episodes=NUM_WORLDS, gamma=GAMMA):
+        self.brain = brain
+        self.buffers = [TrajectoryBuffer() for _ in range(n_worlds)]
+        self.batch_episodes = batch_episodes
+        self.gamma = gamma
+        self.gW1 = np.zeros_like(brain.W1)
+        self.gW2 = np.zeros_like(brain.W2)
+        self.pending_steps = 0
+        self.episode_ms = []
+        self.updates = 0
+
+    def step(self, worlds):
+        obs = [w.observe() for w in worlds]
+        if profiler: profiler.start(None)
+        logits, h = policy_forward(self.brain.W1, self.brain.W2, np.concatenate(obs))
+        actions = sample_actions(logits)
+        if profiler: profiler.lap('inference')
+        bounds = np.cumsum([len(o) for o in obs])[:-1]
+        for w, buf, o, hw, a in zip(worlds, self.buffers, obs, np.split(h, bounds), np.split(actions, bounds)):
+            ids, now = w.ids[w._idx], w.time_ms // DT
+            if buf.free() < len(a):
+                self.accumulate(buf, ids, now)
+                buf.reserve(len(a))
+            buf.record(o, hw, a, ids, now)
+            t = w.time_ms
+            w.apply(o, a)
+            if w.time_ms == 0:  # handle_reset: terminó el episodio
+                self.accumulate(buf)
+                self.episode_ms.append(t + DT)
+        if len(self.episode_ms) >= self.batch_episodes:
+            self.update()
+
+    def accumulate(self, buf, open_ids=None, now=0):
+        """Suma el gradiente de los pasos del buffer; con open_ids (a mitad de episodio) guarda los pendientes."""
+        if buf.size == 0:
+            return
+        n = buf.size
+        G = buf.returns(self.gamma, open_ids, now)
+        pending = np.zeros(n, dtype=bool)
+        if open_ids is not None:
+            pending = np.isin(buf.agent[:n], open_ids) & (buf.step[:n] > now - TRAJ_HORIZON)
+        done = ~pending
+        if done.any():
+            G = G[done]
+            adv = (G - G.mean()) / (G.std() + 1e-8)
+            dW1, dW2 = self.brain.policy_gradient(buf.obs[:n][done], buf.h[:n][done], buf.action[:n][done], adv)
+            self.gW1 += dW1
+            self.gW2 += dW2
+            self.pending_steps += len(G)
+        buf.keep(pending)
+
+    def update(self):
+        if self.pending_steps:
+            self.brain.W1 -= self.brain.lr * self.gW1 / self.pending_steps
+            self.brain.W2 -= self.brain.lr * self.gW2 / self.pending_steps
+        self.updates += 1
+        print(f"[REINFORCE] Actualización {self.updates}: {len(self.episode_ms)} episodios, "
+              f"duración media {np.mean(self.episode_ms):.0f} ms, {self.pending_steps} pasos")
+        self.gW1[:] = 0
+        self.gW2[:] = 0
+        self.pending_steps = 0
+        self.episode_ms = []
+
 # --------------------
-# Ejecución
+# Estrategias evolutivas
 # --------------------
-pygame.init()
-screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
-clock  = pygame.time.Clock()
-
-_ = load_brain()
-start_time_ms = pygame.time.get_ticks()
-envs = [SmallWorld(i) for i in range(NUM_WORLDS)]
-font = pygame.font.SysFont(None, 24)
-
-running = True
-while running:
-    now_ms     = pygame.time.get_ticks()
-    elapsed_ms = now_ms - start_time_ms
-    total_ms   = cumulative_time_ms + elapsed_ms
-
-    for e in pygame.event.get():
-        if e.type == pygame.QUIT:
-            running = False
-
-    screen.fill(BLACK)
-    for idx, w in enumerate(envs):
+N_PARAMS      = OBS_SIZE*HIDDEN_SIZE + HIDDEN_SIZE*NUM_ACTIONS
+ES_NOISE_SEED = 12345     # todos los procesos generan la misma tabla de ruido
+ES_NOISE_SIZE = 1 << 22   # valores de la tabla (16 MiB en float32)
+
+def noise_table():
+    return np.random.default_rng(ES_NOISE_SEED).standard_normal(ES_NOISE_SIZE, dtype=np.float32)
+
+def brain_params(brain):
+    return np.concatenate([brain.W1.ravel(), brain.W2.ravel()])
+
+def brain_from_params(theta):
+    """SimpleBrain cuyos W1 y W2 son vistas sobre el vector plano theta."""
+    k = OBS_SIZE * HIDDEN_SIZE
+    return SimpleBrain.view(theta[:k].reshape(OBS_SIZE, HIDDEN_SIZE), theta[k:].reshape(HIDDEN_SIZE, NUM_ACTIONS))
+
+def centered_ranks(x):
+    """
+    Rangos de x escalados a [-0.5, 0.5]: la aptitud pesa por su orden, no por
+    su valor. Los empates comparten el rango medio, así que un par antitético
+    con la misma duración no aporta gradiente.
+    """
+    _, inv, counts = np.unique(x.ravel(), return_inverse=True, return_counts=True)
+    first = np.cumsum(counts) - counts
+    r = (first + (counts - 1) / 2)[inv]
+    return (r / max(1, x.size - 1) - 0.5).reshape(x.shape)
+
+_es_state = None   # en los procesos de evaluación: (bloque compartido, theta central, tabla de ruido)
+
+def _es_init(shm_name):
+    global _es_state, episode_log
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # el padre gestiona Ctrl+C
+    sys.stdout = open(os.devnull, 'w')            # cada evaluación anuncia su reinicio
+    episode_log = []                              # el récord no se guarda desde aquí (ver handle_reset)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _es_state = (shm, np.ndarray(N_PARAMS, np.float64, shm.buf), noise_table())
+
+def _es_evaluate(task):
+    """Duración en ms del episodio del candidato theta + sign*sigma*ruido[idx:idx+N_PARAMS]."""
+    idx, sign, sigma, seed, initial_agents, max_ms = task
+    _, theta, noise = _es_state
+    random.seed(seed)
+    np.random.seed(seed)
+    w = ArrayWorld(0, initial_agents, brain=brain_from_params(theta + sign * sigma * noise[idx:idx + N_PARAMS]))
+    episode_log.clear()
+    while w.time_ms < max_ms:
+        t = w.time_ms
         w.update()
-        r,c = divmod(idx, WORLD_COLS)
-        ox,oy = c*WORLD_W, r*WORLD_H
-
-        for x,y in w.bushes:
-            pygame.draw.rect(screen, BUSH_COLOR, (ox+x*CELL_SIZE, oy+y*CELL_SIZE, CELL_SIZE, CELL_SIZE))
-        for x,y in w.lakes:
-            pygame.draw.rect(screen, LAKE_COLOR, (ox+x*CELL_SIZE, oy+y*CELL_SIZE, CELL_SIZE, CELL_SIZE))
-        for ag in w.agents:
-            col = STAGE_COLORS[ag.stage]
-            cx = ox+ag.x*CELL_SIZE+CELL_SIZE//2
-            cy = oy+ag.y*CELL_SIZE+CELL_SIZE//2
-            pygame.draw.circle(screen, col, (cx, cy), CELL_SIZE//2)
+        if w.time_ms == 0:  # handle_reset: murieron todos
+            return t + DT
+    return max_ms
+
+class EvolutionStrategy:
+    """
+    OpenAI-ES sobre los pesos de un SimpleBrain central. Cada generación evalúa
+    `pairs` pares antitéticos theta ± sigma*eps, cada candidato en su propio
+    ArrayWorld y todos con la misma semilla de mapa. Los eps son trozos de una
+    tabla de ruido que cada proceso genera con ES_NOISE_SEED y theta está en
+    memoria compartida, así que a los procesos sólo se les envía el índice del
+    trozo y sólo devuelven la duración del episodio. El gradiente se estima con
+    los rangos centrados de esas duraciones.
+    """
+    def __init__(self, brain, n_workers, pairs=16, sigma=0.02, lr=0.01, max_ms=300_000,
+                 initial_agents=INITIAL_AGENTS, seed=None):
+        self.pairs, self.sigma, self.lr = pairs, sigma, lr
+        self.max_ms, self.initial_agents = max_ms, initial_agents
+        self.shm = shared_memory.SharedMemory(create=True, size=N_PARAMS * 8)
+        self.theta = np.ndarray(N_PARAMS, np.float64, self.shm.buf)
+        self.theta[:] = brain_params(brain)
+        self.brain = brain_from_params(self.theta)
+        self.noise = noise_table()
+        self.rng = np.random.default_rng(seed)
+        self.pool = mp.Pool(n_workers, _es_init, (self.shm.name,))
+        self.generation = 0
+
+    def step(self):
+        """Una generación: evalúa los candidatos, mueve theta y devuelve sus duraciones (pairs x 2)."""
+        idx = self.rng.integers(0, ES_NOISE_SIZE - N_PARAMS, self.pairs)
+        seed = int(self.rng.integers(2**31))
+        tasks = [(int(i), sign, self.sigma, seed, self.initial_agents, self.max_ms)
+                 for i in idx for sign in (1, -1)]
+        fitness = np.array(self.pool.map(_es_evaluate, tasks), dtype=np.float64).reshape(self.pairs, 2)
+        ranks = centered_ranks(fitness)
+        eps = np.stack([self.noise[i:i + N_PARAMS] for i in idx])
+        self.theta += self.lr * ((ranks[:, 0] - ranks[:, 1]) @ eps) / (len(tasks) * self.sigma)
+        self.generation += 1
+        return fitness
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        del self.brain, self.theta
+        self.shm.close()
+        self.shm.unlink()
+
+# --------------------
+# Instrumentación
+# --------------------
+class PhaseProfiler:
+    """
+    Tiempo por fase (PHASES) y contadores (COUNTERS) de cada mundo a lo largo
+    de un cuadro. Se mide por vueltas: start(mundo) pone el cronómetro en
+    marcha y cada lap(fase) suma a esa fase lo transcurrido desde la marca
+    anterior. El mundo None es el trabajo compartido (inferencia en lote,
+    panel). frame() cierra el cuadro: actualiza las medias del panel y, con
+    `out`, escribe una fila por mundo en un CSV o, si acaba en .jsonl, JSONL.
+    Los mundos sólo miden mientras el global `profiler` apunta a uno.
+    """
+    def __init__(self, out=None):
+        self.rows = {}   # mundo -> (segundos por fase, contadores) del cuadro en curso
+        self.cur = None
+        self.t0 = 0.0
+        self.frames = 0
+        self.start_time = time.perf_counter()
+        self.avg_ms = dict.fromkeys(PHASES, 0.0)       # media móvil por cuadro, todos los mundos
+        self.avg_count = dict.fromkeys(COUNTERS, 0.0)
+        self.file = open(out, 'w', newline='') if out else None
+        self.jsonl = bool(out) and out.endswith('.jsonl')
+        if self.file and not self.jsonl:
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(['frame', 'time_s', 'world'] + [f'{p}_ms' for p in PHASES] + list(COUNTERS))
+
+    def start(self, world):
+        row = self.rows.get(world)
+        if row is None:
+            row = self.rows[world] = (dict.fromkeys(PHASES, 0.0), dict.fromkeys(COUNTERS, 0))
+        self.cur = row
+        self.t0 = time.perf_counter()
+
+    def lap(self, phase):
+        t = time.perf_counter()
+        self.cur[0][phase] += t - self.t0
+        self.t0 = t
+
+    def count(self, **counts):
+        for name, k in counts.items():
+            self.cur[1][name] += k
+
+    def frame(self):
+        self.frames += 1
+        for p in PHASES:
+            ms = 1000 * sum(times[p] for times, _ in self.rows.values())
+            self.avg_ms[p] = 0.9*self.avg_ms[p] + 0.1*ms
+        for c in COUNTERS:
+            self.avg_count[c] = 0.9*self.avg_count[c] + 0.1*sum(counts[c] for _, counts in self.rows.values())
+        if self.file:
+            t = round(time.perf_counter() - self.start_time, 4)
+            for world, (times, counts) in self.rows.items():
+                ms = [round(1000 * times[p], 4) for p in PHASES]
+                world = -1 if world is None else world
+                if self.jsonl:
+                    row = dict(frame=self.frames, time_s=t, world=world)
+                    row.update((f'{p}_ms', v) for p, v in zip(PHASES, ms))
+                    row.update(counts)
+                    self.file.write(json.dumps(row) + '\n')
+                else:
+                    self.csv.writerow([self.frames, t, world] + ms + [counts[c] for c in COUNTERS])
+        self.rows.clear()
+
+    def lines(self):
+        """Texto para el panel lateral: ms por cuadro de cada fase y contadores."""
+        c = self.avg_count
+        return (["Fases (ms/cuadro):"]
+                + [f"  {p}: {self.avg_ms[p]:.1f}" for p in PHASES]
+                + [f"  agentes: {c['agents']:.0f}",
+                   f"  nac./muertes: {c['births']:.1f}/{c['deaths']:.1f}",
+                   f"  reinicios: {c['resets']:.2f}",
+                   f"  dibujos: {c['draws']:.0f}"])
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+class CProfileWindow:
+    """
+    Ejecuta con cProfile los próximos `ticks` ticks cuando se pide (tecla P o,
+    sin ventana, SIGUSR1). Al terminar guarda el perfil en
+    tick_profile_<fecha>.prof e imprime las funciones más costosas.
+    """
+    def __init__(self, ticks=300):
+        self.ticks = ticks
+        self.left = 0
+        self.prof = None
+
+    def request(self):
+        if not self.left:
+            print(f"[cProfile] Perfilando {self.ticks} ticks...")
+            self.prof = cProfile.Profile()
+            self.left = self.ticks
+
+    def wrap(self, step):
+        """step tal cual si no hay ventana abierta; si no, step bajo el perfilador."""
+        if not self.left:
+            return step
+        def profiled(envs):
+            if not self.left:   # la ventana se cerró a mitad de cuadro
+                return step(envs)
+            self.prof.runcall(step, envs)
+            self.left -= 1
+            if not self.left:
+                self.report()
+        return profiled
+
+    def report(self):
+        path = time.strftime('tick_profile_%Y%m%d-%H%M%S.prof')
+        self.prof.dump_stats(path)
+        print(f"[cProfile] Guardado en {path}")
+        pstats.Stats(self.prof).sort_stats('cumulative').print_stats(15)
+        self.prof = None
+
+def start_profiler(args):
+    """Crea el PhaseProfiler de la ejecución (activo desde el principio con --profile o --profile-out)."""
+    global profiler
+    phases = PhaseProfiler(args.profile_out)
+    if args.profile or args.profile_out:
+        profiler = phases
+    return phases
+
+def toggle_profiler(phases):
+    global profiler
+    profiler = None if profiler else phases
+
+def stop_profiler(phases):
+    global profiler
+    profiler = None
+    phases.close()
+
+# --------------------
+# Ejecución
+# --------------------
+class TickScheduler:
+    """
+    Decide cuántos ticks de simulación corren por cuadro dibujado. El modo es
+    un K fijo, 'auto' (K se ajusta para llenar FRAME_BUDGET según lo que tarda
+    cada tick) u 'off' (no se dibujan los mundos y se simula sin tope de FPS).
+    Con K = 1 el bucle se comporta como siempre: un tick por cuadro.
+    """
+    def __init__(self, mode=1, budget=FRAME_BUDGET):
+        self.mode = mode
+        self.budget = budget
+        self.tick_s = None   # media móvil de segundos por tick
+
+    @property
+    def drawing(self):
+        return self.mode != 'off'
+
+    def label(self):
+        if self.mode == 'off':
+            return "sin dibujo"
+        if self.mode == 'auto':
+            return f"auto ({self.ticks()}x)"
+        return f"{self.mode}x"
+
+    def ticks(self):
+        if self.mode == 'auto':
+            return max(1, int(self.budget / self.tick_s)) if self.tick_s else 1
+        return self.mode
+
+    def run(self, step, envs):
+        start = time.perf_counter()
+        k = 0
+        if self.mode == 'off':
+            # Bloques de ~0.25 s para seguir atendiendo los eventos de la ventana
+            while time.perf_counter() - start < 0.25:
+                step(envs)
+                k += 1
+        else:
+            for _ in range(self.ticks()):
+                step(envs)
+                k += 1
+        per_tick = (time.perf_counter() - start) / k
+        self.tick_s = per_tick if self.tick_s is None else 0.8*self.tick_s + 0.2*per_tick
+
+def make_worlds(args):
+    """Crea los mundos y la función que los avanza un tick según los argumentos."""
+    _ = load_brain()
+    if args.reinforce:
+        trainer = ReinforceTrainer(best_brain.copy() if best_brain else SimpleBrain(), NUM_WORLDS)
+        envs = [ArrayWorld(i, brain=trainer.brain) for i in range(NUM_WORLDS)]
+        return envs, trainer.step
+    world_cls = WORLD_ENGINES[args.engine]
+    return [world_cls(i) for i in range(NUM_WORLDS)], step_worlds
+
+def stats_arrays(elapsed_ms=0):
+    return dict(resets_count=resets_count,
+                cumulative_time_ms=cumulative_time_ms + elapsed_ms,
+                best_age=best_age)
+
+def save_stats(elapsed_ms):
+    global cumulative_time_ms
+    cumulative_time_ms += elapsed_ms
+    atomic_savez(STATS_FILE, **stats_arrays())
+
+class CheckpointWriter:
+    """
+    Hilo que guarda best_brain.npz y stats.npz fuera del bucle de simulación.
+    Si llegan varios récords antes de escribir sólo se guarda el último; las
+    estadísticas (con el tiempo transcurrido según elapsed_ms()) se vuelcan cada
+    stats_every segundos. En CHECKPOINT_DIR se conservan las últimas keep
+    versiones del cerebro (prefix_NNNNNN.npz) con sus metadatos y timestamp;
+    cada prefix rota por separado, así que run_es no borra los récords.
+    """
+    def __init__(self, elapsed_ms, stats_every=30.0, keep=5, directory=CHECKPOINT_DIR, prefix='best_brain'):
+        self.elapsed_ms = elapsed_ms
+        self.stats_every = stats_every
+        self.keep = keep
+        self.directory = directory
+        self.prefix = prefix
+        self._name = re.compile(re.escape(prefix) + r'_(\d+)\.npz')   # otros ficheros se ignoran
+        os.makedirs(directory, exist_ok=True)
+        self.version = max([self._version_of(p) for p in self._versions()], default=0)
+        self._cond = threading.Condition()
+        self._pending = None   # (W1, W2, meta) del último récord sin escribir
+        self._stopping = False
+        self.thread = threading.Thread(target=self._loop, name='checkpoints', daemon=True)
+        self.thread.start()
+
+    def _versions(self):
+        names = [n for n in os.listdir(self.directory) if self._name.fullmatch(n)]
+        return [os.path.join(self.directory, n) for n in sorted(names, key=self._version_of)]
+
+    def _version_of(self, path):
+        return int(self._name.fullmatch(os.path.basename(path)).group(1))
+
+    def submit(self, brain, **meta):
+        with self._cond:
+            self._pending = (brain.W1.copy(), brain.W2.copy(), meta)
+            self._cond.notify()
+
+    def _write_brain(self, W1, W2, meta):
+        meta = dict(meta, timestamp=time.time())
+        atomic_savez(BEST_BRAIN_FILE, W1=W1, W2=W2, **meta)
+        if self.keep > 0:
+            self.version += 1
+            atomic_savez(os.path.join(self.directory, f'{self.prefix}_{self.version:06d}.npz'), W1=W1, W2=W2, **meta)
+        versions = self._versions()
+        for old in versions[:len(versions) - self.keep]:   # con keep == 0, todas
+            os.remove(old)
+
+    def _loop(self):
+        next_stats = time.monotonic() + self.stats_every
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopping and time.monotonic() < next_stats:
+                    self._cond.wait(next_stats - time.monotonic())
+                pending, self._pending = self._pending, None
+                stopping = self._stopping
+            if pending:
+                self._write_brain(*pending)
+            if stopping:
+                return
+            if time.monotonic() >= next_stats:
+                atomic_savez(STATS_FILE, **stats_arrays(self.elapsed_ms()))
+                next_stats = time.monotonic() + self.stats_every
+
+    def close(self):
+        """Escribe lo pendiente y detiene el hilo (las estadísticas finales las guarda save_stats)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self.thread.join()
+
+def start_checkpoints(args, elapsed_ms, prefix='best_brain'):
+    global checkpoints
+    checkpoints = CheckpointWriter(elapsed_ms, args.checkpoint_every, args.keep_brains, prefix=prefix)
+
+def stop_checkpoints(elapsed_ms):
+    global checkpoints
+    checkpoints.close()
+    checkpoints = None
+    save_stats(elapsed_ms)
+
+def run_headless(args):
+    """Sin ventana, sin fuentes y sin límite de FPS: los mundos avanzan tan rápido como se pueda."""
+    if args.workers:
+        _ = load_brain()
+        runner = ParallelWorlds(args.workers, engine=args.engine)
+        envs, step, per_step = None, lambda _: runner.step(), runner.ticks_per_sync
+    else:
+        envs, step = make_worlds(args)
+        per_step = 1
+    start = last_report = time.perf_counter()
+    ticks = last_ticks = 0
+    start_checkpoints(args, lambda: int((time.perf_counter() - start) * 1000))
+    phases = start_profiler(args)
+    window = CProfileWindow(args.cprofile_ticks)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda *_: window.request())
+    try:
+        while args.duration is None or time.perf_counter() - start < args.duration:
+            window.wrap(step)(envs)
+            if profiler:
+                profiler.frame()
+            ticks += per_step
+            now = time.perf_counter()
+            if now - last_report >= args.report_every:
+                rate = (ticks - last_ticks) * DT / (now - last_report)
+                print(f"[Headless] {rate:.0f} ms simulados/s por mundo | "
+                      f"Mundos creados: {resets_count} | Mejor tiempo: {best_age} ms")
+                if profiler:
+                    print("[Fases] " + " | ".join(f"{p} {ms:.1f} ms" for p, ms in profiler.avg_ms.items()))
+                last_report, last_ticks = now, ticks
+    except KeyboardInterrupt:
+        pass
+    if args.workers:
+        runner.close()
+    stop_profiler(phases)
+    stop_checkpoints(int((time.perf_counter() - start) * 1000))
+
+def run_es(args):
+    """
+    Optimiza con EvolutionStrategy y guarda el cerebro central en best_brain.npz
+    tras cada generación, marcado con es_generation/es_fitness (sin best_age:
+    no es un récord de supervivencia). Sus versiones rotan aparte, como
+    CHECKPOINT_DIR/es_brain_NNNNNN.npz.
+    """
+    global resets_count
+    brain = load_brain() or SimpleBrain()
+    es = EvolutionStrategy(brain, args.workers or os.cpu_count(), args.es_pairs,
+                           args.es_sigma, args.es_lr, args.es_max_ms)
+    start = time.perf_counter()
+    start_checkpoints(args, lambda: int((time.perf_counter() - start) * 1000), prefix='es_brain')
+    try:
+        while ((args.duration is None or time.perf_counter() - start < args.duration)
+               and (args.es_generations is None or es.generation < args.es_generations)):
+            t = time.perf_counter()
+            fitness = es.step()
+            resets_count += fitness.size
+            checkpoints.submit(es.brain, es_generation=es.generation, es_fitness=fitness.mean(),
+                               resets_count=resets_count)
+            print(f"[ES] Generación {es.generation}: media {fitness.mean():.0f} ms, "
+                  f"mejor {fitness.max():.0f} ms ({time.perf_counter() - t:.1f} s)")
+    except KeyboardInterrupt:
+        pass
+    es.close()
+    stop_checkpoints(int((time.perf_counter() - start) * 1000))
+
+def run_gui(args):
+    import pygame
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+    clock  = pygame.time.Clock()
+
+    runner = None
+    if args.workers:
+        # Los mundos viven en otros procesos; se dibujan desde memoria compartida
+        _ = load_brain()
+        runner = ParallelWorlds(args.workers, engine=args.engine, shared=True)
+        runner.run()
+        envs, step = runner.states, lambda _: runner.poll()
+    else:
+        envs, step = make_worlds(args)
+    start_time_ms = pygame.time.get_ticks()
+    start_checkpoints(args, lambda: pygame.time.get_ticks() - start_time_ms)
+    font = pygame.font.SysFont(None, 24)
+    scheduler = TickScheduler()
+    phases = start_profiler(args)
+    window = CProfileWindow(args.cprofile_ticks)
+
+    # Cada mundo se compone como una imagen RGB de MAP_WIDTH x MAP_HEIGHT
+    # (una celda = un píxel, indexada [x, y] como surfarray) y se escala al blitear
+    rgb        = np.zeros((MAP_WIDTH, MAP_HEIGHT, 3), dtype=np.uint8)
+    map_surf   = pygame.Surface((MAP_WIDTH, MAP_HEIGHT))
+    world_surf = pygame.Surface((WORLD_W, WORLD_H))
+    stage_rgb  = np.array([STAGE_COLORS[s] for s in STAGES], dtype=np.uint8)
+
+    def world_rgb(w):
+        rgb[:] = BLACK
+        rgb[w.bush_grid.T] = BUSH_COLOR
+        rgb[w.lake_grid.T] = LAKE_COLOR
+        x, y, stage = w.agent_arrays()
+        rgb[x, y] = stage_rgb[stage]
+
+    def draw_world(w, ox, oy):
+        if isinstance(w, SharedWorldState):
+            w.read(world_rgb)
+        else:
+            world_rgb(w)
+        pygame.surfarray.blit_array(map_surf, rgb)
+        pygame.transform.scale(map_surf, (WORLD_W, WORLD_H), world_surf)
+        screen.blit(world_surf, (ox, oy))
         pygame.draw.rect(screen, BOUNDARY_COLOR, (ox,oy,WORLD_W,WORLD_H), 1)
 
-    # Panel lateral
-    panel_x = WORLD_W * WORLD_COLS
-    pygame.draw.rect(screen, PANEL_BG_COLOR, (panel_x,0,PANEL_WIDTH,SCREEN_H))
-    lines = [
-        f"Mundos creados: {resets_count}",
-        f"Tiempo global:",
-        f"  {total_ms//1000} s",
-        f"  {total_ms//60000} m",
-        f"Mejor tiempo:",
-        f"  {best_age} ms",
-        f"  {best_age/1000:.2f} s",
-        f"  {best_age/60000:.2f} m",
-    ]
-    for i, text in enumerate(lines):
-        surf = font.render(text, True, (255,255,255))
-        screen.blit(surf, (panel_x+10,10+i*28))
-
-    pygame.display.flip()
-    clock.tick(FPS)
-
-# Persistencia al cerrar
-cumulative_time_ms += pygame.time.get_ticks() - start_time_ms
-np.savez(STATS_FILE,
-         resets_count=resets_count,
-         cumulative_time_ms=cumulative_time_ms,
-         best_age=best_age)
-
-pygame.quit()
+    running = True
+    while running:
+        now_ms     = pygame.time.get_ticks()
+        elapsed_ms = now_ms - start_time_ms
+        total_ms   = cumulative_time_ms + elapsed_ms
+
+        for e in pygame.event.get():
+            if e.type == pygame.QUIT:
+                running = False
+            elif e.type == pygame.KEYDOWN and e.unicode in SPEED_KEYS:
+                scheduler.mode = SPEED_KEYS[e.unicode]
+            elif e.type == pygame.KEYDOWN and e.unicode in ('i', 'I'):
+                toggle_profiler(phases)
+            elif e.type == pygame.KEYDOWN and e.unicode in ('p', 'P'):
+                if runner:
+                    # Los ticks corren en los trabajadores; aquí sólo se vería poll()
+                    print("[cProfile] No disponible con --workers: los mundos se simulan en otros procesos")
+                else:
+                    window.request()
+
+        prof = profiler
+        if runner:
+            step(envs)   # los trabajadores ya simulan sin pausa
+        else:
+            scheduler.run(window.wrap(step), envs)
+        screen.fill(BLACK)
+        if scheduler.drawing:
+            for idx, w in enumerate(envs):
+                if prof: prof.start(idx)
+                r,c = divmod(idx, WORLD_COLS)
+                draw_world(w, c*WORLD_W, r*WORLD_H)
+                if prof:
+                    prof.lap('draw')
+                    prof.count(draws=1)
+
+        # Panel lateral
+        if prof: prof.start(None)
+        panel_x = WORLD_W * WORLD_COLS
+        pygame.draw.rect(screen, PANEL_BG_COLOR, (panel_x,0,PANEL_WIDTH,SCREEN_H))
+        lines = [
+            f"Mundos creados: {resets_count}",
+            f"Tiempo global:",
+            f"  {total_ms//1000} s",
+            f"  {total_ms//60000} m",
+            f"Mejor tiempo:",
+            f"  {best_age} ms",
+            f"  {best_age/1000:.2f} s",
+            f"  {best_age/60000:.2f} m",
+            f"Velocidad:",
+            f"  {scheduler.label()}",
+        ]
+        if prof:
+            lines += prof.lines()
+        for i, text in enumerate(lines):
+            surf = font.render(text, True, (255,255,255))
+            screen.blit(surf, (panel_x+10,10+i*28))
+
+        pygame.display.flip()
+        if prof:
+            prof.lap('draw')
+            prof.frame()
+        clock.tick(FPS if scheduler.drawing else 0)
+
+    # Persistencia al cerrar
+    if runner:
+        runner.close()
+    stop_profiler(phases)
+    stop_checkpoints(pygame.time.get_ticks() - start_time_ms)
+    pygame.quit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrenamiento de 16 mundos en paralelo")
+    parser.add_argument('--engine', choices=sorted(WORLD_ENGINES), default='objects',
+                        help="motor de simulación: 'objects' (un AgentCell por agente) o 'arrays' (vectorizado)")
+    parser.add_argument('--reinforce', action='store_true',
+                        help="entrenar un cerebro compartido con REINFORCE (usa el motor 'arrays')")
+    parser.add_argument('--headless', action='store_true',
+                        help="sin pygame ni ventana; simula a máxima velocidad (Ctrl+C para salir)")
+    parser.add_argument('--duration', type=float, default=None,
+                        help="segundos reales de simulación en modo headless (por defecto, sin límite)")
+    parser.add_argument('--report-every', type=float, default=5.0,
+                        help="segundos entre informes de velocidad en modo headless")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="repartir los mundos entre N procesos")
+    parser.add_argument('--checkpoint-every', type=float, default=30.0,
+                        help="segundos entre volcados periódicos de stats.npz")
+    parser.add_argument('--keep-brains', type=int, default=5,
+                        help=f"versiones de cada cerebro (récords y ES, por separado) que se conservan en {CHECKPOINT_DIR}/ (0: ninguna)")
+    parser.add_argument('--profile', action='store_true',
+                        help="medir desde el principio el tiempo por fase de cada mundo (tecla I en la ventana)")
+    parser.add_argument('--profile-out', default=None,
+                        help="volcar las fases de cada cuadro a un CSV (o JSONL si acaba en .jsonl); implica --profile")
+    parser.add_argument('--cprofile-ticks', type=int, default=300,
+                        help="ticks que se perfilan con cProfile al pulsar P (o con SIGUSR1 sin ventana); P no perfila con --workers")
+    parser.add_argument('--es', action='store_true',
+                        help="optimizar best_brain.npz con estrategias evolutivas (sin ventana; --workers procesos)")
+    parser.add_argument('--es-pairs', type=int, default=16, help="pares antitéticos por generación")
+    parser.add_argument('--es-sigma', type=float, default=0.02, help="desviación de las perturbaciones")
+    parser.add_argument('--es-lr', type=float, default=0.01, help="paso del gradiente estimado")
+    parser.add_argument('--es-max-ms', type=int, default=300_000,
+                        help="duración máxima (ms simulados) de un episodio de evaluación")
+    parser.add_argument('--es-generations', type=int, default=None,
+                        help="generaciones a ejecutar (por defecto, hasta --duration o Ctrl+C)")
+    args = parser.parse_args()
+    if args.keep_brains < 0:
+        parser.error("--keep-brains no puede ser negativo")
+    if args.workers and args.reinforce:
+        parser.error("--workers no admite --reinforce")
+    if args.es and args.reinforce:
+        parser.error("--es no admite --reinforce")
+    if args.es:
+        run_es(args)
+    elif args.headless:
+        run_headless(args)
+    else:
+        run_gui(args)
+
+if __name__ == '__main__':
+    main()